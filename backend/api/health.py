@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from backend.services.health_service import start_warmup, readiness
+
+router = APIRouter()
+
+@router.get("/live")
+def live():
+    return {"status": "ok"}
+
+@router.get("/ready")
+def ready():
+    # the first probe kicks off model loading; 503 until it has finished
+    start_warmup()
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
@@ -1,16 +1,27 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, HTTPException
 from typing import List
-from backend.services.ingestion_service import ingest_file
+from backend.services.ingestion_service import save_upload, submit_ingest_job
+from backend.services.job_service import get_job
 
 router = APIRouter()
 
 @router.post("/")
 async def ingest(files: List[UploadFile] = File(..., description="Upload WhatsApp chat files")):
     
-    results = []
+    uploads = []
 
     for file in files:
-        result = await ingest_file(file)
-        results.append(result)
+        uploads.append(await save_upload(file))
 
-    return {"status": "completed", "results": results}
\ No newline at end of file
+    # parsing, embedding and vector writes run on the job worker pool so the
+    # event loop keeps serving queries while large uploads are processed
+    job = submit_ingest_job(uploads)
+
+    return {"status": "queued", "job_id": job.job_id}
+
+@router.get("/jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List
-from backend.services.query_service import run_query
+from backend.services.query_service import run_query, stream_query
 
 router = APIRouter()
 
@@ -14,3 +15,10 @@ def query(request: QueryRequest):
     answer = run_query(request.question, request.sources)
     return {"answer": answer}
 
+@router.post("/stream")
+def query_stream(request: QueryRequest):
+    return StreamingResponse(
+        stream_query(request.question, request.sources),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
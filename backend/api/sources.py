@@ -1,5 +1,7 @@
-from fastapi import APIRouter
-from backend.services.registry_service import list_sources, delete_source,deactivate_source, reactivate_source
+from fastapi import APIRouter, HTTPException
+from backend.services.registry_service import list_sources, get_source, deactivate_source, reactivate_source
+from backend.services.source_service import submit_purge_job
+from backend.services.job_service import get_job
 
 router = APIRouter()
 
@@ -19,5 +21,16 @@ def reactivate(source_id:str):
 
 @router.delete("/{source_id}")
 def remove_source(source_id: str):
-    return delete_source(source_id)
+    if get_source(source_id) is None:
+        raise HTTPException(status_code=404, detail="Source not found")
 
+    # vectors and files are removed on the job worker; poll /sources/jobs/{job_id}
+    job = submit_purge_job(source_id)
+    return {"status": "queued", "job_id": job.job_id}
+
+@router.get("/jobs/{job_id}")
+def get_purge_job(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -1,6 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from backend.api import ingest, query, sources
+from fastapi.responses import PlainTextResponse
+from backend.api import ingest, query, sources, health
+from backend.services.db import init_db
+from rag import metrics
+
+init_db()
 
 app = FastAPI(title="Whatsapp RAG Backend")
 
@@ -14,4 +19,9 @@ app.add_middleware(
 
 app.include_router(ingest.router, prefix="/ingest", tags=["Ingest"])
 app.include_router(query.router, prefix="/query",tags=["Query"])
-app.include_router(sources.router, prefix="/sources",tags=["Sources"])
\ No newline at end of file
+app.include_router(sources.router, prefix="/sources",tags=["Sources"])
+app.include_router(health.router, prefix="/health",tags=["Health"])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,33 +1,151 @@
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 DB_PATH = Path("backend/registry.db")
+DB_POOL_SIZE = int(os.getenv("REGISTRY_POOL_SIZE", "4"))
+# how long a writer waits for another writer before "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
 
-    conn = get_connection()
-    cursor = conn.cursor()
+class ConnectionPool:
+    """
+    Long-lived connections handed out one caller at a time. WAL lets the
+    readers run while a writer commits, and busy_timeout makes
+    concurrent writers queue instead of failing.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return get_connection()
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """Commits when the block succeeds, rolls back when it raises."""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+
+pool = ConnectionPool()
+
+def connection():
+    return pool.connection()
 
+
+# Each migration runs once, in order, in its own transaction together with
+# the PRAGMA user_version bump that records it.
+def _add_columns(cursor, table, columns):
+    """adds the (name, type) columns table lacks, so a re-run is harmless"""
+    existing = {row["name"] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, column_type in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+def _create_sources(cursor):
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS sources (
             source_id TEXT PRIMARY KEY,
             chunk_count INTEGER,
             active INTEGER,
-            created_at TEXT
+            created_at TEXT,
+            content_hash TEXT,
+            last_message_ts TEXT,
+            last_message_hash TEXT
         )
         """
     )
 
-    conn.commit()
-    conn.close()
+    # registries created before user_version was tracked lack the later columns
+    _add_columns(cursor, "sources", [
+        ("content_hash", "TEXT"),
+        ("last_message_ts", "TEXT"),
+        ("last_message_hash", "TEXT"),
+    ])
+
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sources_content_hash ON sources(content_hash)"
+    )
+
+def _add_source_stats(cursor):
+    # registries interrupted here before migrations were transactional
+    # already have some of these
+    _add_columns(cursor, "sources", [
+        ("bytes", "INTEGER DEFAULT 0"),
+        ("message_count", "INTEGER DEFAULT 0"),
+        ("ingest_seconds", "REAL DEFAULT 0"),
+        ("updated_at", "TEXT"),
+    ])
+
+MIGRATIONS = [
+    _create_sources,
+    _add_source_stats,
+]
+
+def init_db():
+    with connection() as conn:
+        cursor = conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            # sqlite3 runs DDL outside any implicit transaction, so without
+            # this each ALTER TABLE would commit on its own
+            cursor.execute("BEGIN")
+            try:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version={i}")
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
 
 
 if __name__ == "__main__":
     init_db()
-    print("Database initialized")
\ No newline at end of file
+    print("Database initialized")
@@ -0,0 +1,40 @@
+import os
+import threading
+import traceback
+from rag import models
+
+# also load the Ollama model during warmup (needs Ollama to be reachable)
+WARMUP_LLM = os.getenv("WARMUP_LLM", "0") == "1"
+
+_state = {"status": "cold", "error": None}
+_lock = threading.Lock()
+
+
+def _warmup():
+    try:
+        models.warmup()
+        if WARMUP_LLM:
+            from backend.services.query_service import rag_pipeline
+            rag_pipeline.generator.warmup()
+    except Exception as e:
+        traceback.print_exc()
+        with _lock:
+            _state.update(status="failed", error=str(e))
+        return
+
+    with _lock:
+        _state.update(status="ready", error=None)
+
+def start_warmup():
+    """Starts loading the models in the background once; later calls are no-ops."""
+    with _lock:
+        if _state["status"] not in ("cold", "failed"):
+            return
+        _state.update(status="warming", error=None)
+    threading.Thread(target=_warmup, name="warmup", daemon=True).start()
+
+def readiness():
+    with _lock:
+        state = dict(_state)
+    state["models"] = models.loaded_models()
+    return state
@@ -0,0 +1,93 @@
+import os
+import time
+from pathlib import Path
+
+# "text": embed each chunk's text once
+# "centroid": reuse the message embeddings computed while chunking
+EMBEDDING_MODE = os.getenv("CHUNK_EMBEDDING_MODE", "text")
+
+# The model-loading modules are imported inside the functions below so that
+# a spawned worker process can apply its thread limits before torch loads.
+
+
+def no_report(stage, fraction):
+    pass
+
+def init_worker(num_threads, sender_lock=None):
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    os.environ["MKL_NUM_THREADS"] = str(num_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    # read by rag.ingestion.onnx_backend when the ONNX embedding backend loads
+    os.environ["ONNX_THREADS"] = str(num_threads)
+
+    import torch
+    torch.set_num_threads(num_threads)
+
+    if sender_lock is not None:
+        # share the parent's lock on sender_map.json
+        from rag.chunking import preprocessing
+        preprocessing.sender_map_lock = sender_lock
+
+def track_last(messages, last):
+    for msg in messages:
+        last["ts"] = msg["timestamp"]
+        last["hash"] = msg["message_hash"]
+        yield msg
+
+def build_chunks(file_path, encode=None, sender_map=None, watermark=None, report=no_report):
+    """
+    Parse → chunk → embed for one saved export. Nothing is written to the
+    vector store here, so this can run in any process.
+
+    watermark is the (timestamp, message_hash) of the last message already
+    ingested for this source; only later messages are chunked and embedded.
+    The returned watermark covers the new messages, or is None if there
+    were none.
+    """
+    from rag.chunking.preprocessing import stream_whatsapp_chat, messages_after
+    from rag.chunking.chunking import create_chunks, embedder
+
+    if encode is None:
+        encode = embedder.encode
+
+    file_name = Path(file_path).stem
+    timings = {}
+
+    print(f"Ingestion started for {file_name}")
+    # parsing is a generator consumed by the chunker, so the two stages
+    # run interleaved and are timed together
+    report("parse_chunk", 0.0)
+    start = time.time()
+    print("parsing and chunking started")
+    last = {}
+    messages = stream_whatsapp_chat(file_path, file_name, sender_map)
+    if watermark:
+        messages = messages_after(messages, *watermark)
+    messages = track_last(messages, last)
+    if EMBEDDING_MODE == "centroid":
+        chunks, centroids = create_chunks(messages, file_name, return_centroids=True, append=bool(watermark))
+    else:
+        chunks = create_chunks(messages, file_name, append=bool(watermark))
+    timings["parse_chunk"] = time.time() - start
+    print("Parsing + chunking time:", timings["parse_chunk"])
+
+    report("embed", 0.4)
+    start = time.time()
+    print("embedding started")
+    if EMBEDDING_MODE == "centroid":
+        embeddings = [centroid.tolist() for centroid in centroids]
+    else:
+        embeddings = encode([chunk["text"] for chunk in chunks])
+    timings["embed"] = time.time() - start
+    print("Embedding time:", timings["embed"])
+
+    return {
+        "file_name": file_name,
+        "chunks": chunks,
+        "embeddings": embeddings,
+        "watermark": (last["ts"], last["hash"]) if last else None,
+        "timings": timings
+    }
+
+def build_chunks_in_worker(file_path, watermark=None):
+    return build_chunks(file_path, watermark=watermark)
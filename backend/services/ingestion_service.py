@@ -1,46 +1,118 @@
 import os
 import time
-from rag.chunking.preprocessing import parse_whatsapp_chat
-from rag.chunking.chunking import create_chunks
-from rag.ingestion.embedder import Embedder
-from rag.ingestion.vectordb import VectorDB
-from backend.services.registry_service import add_source
+import hashlib
+import threading
+from uuid import uuid4
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
 from pathlib import Path
+from rag.chunking.preprocessing import sender_map_lock
+from rag.ingestion.embedder import Embedder
+from rag.ingestion.vectordb import open_vectordb
+from rag.retrieval.time_range import to_epoch
+from rag.metrics import INGEST_STAGE_SECONDS, INGEST_MESSAGES, INGEST_CHUNKS, INGEST_FILES, register_cache, register_collector
+from backend.services.registry_service import add_source, find_source_by_hash, get_source, list_sources
+from backend.services.job_service import submit_job
+from backend.services.ingest_worker import build_chunks, build_chunks_in_worker, init_worker, no_report
 
 RAW_DIR = "data/raw"
 COLLECTION_NAME = "whatsapp_chunks"
 PERSIST_DIR = "vector_store"
+BATCH_SIZE = 2000
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# files built concurrently per upload; 1 keeps everything in the job thread
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", "1"))
 
 embedder = Embedder()
 
-async def ingest_file(upload_file):
+write_lock = threading.Lock()
+
+if embedder.cache is not None:
+    register_cache("embedding", embedder.cache.stats)
+
+def source_metrics():
+    sources = list_sources()
+    return [
+        ("rag_source_chunks", "gauge", "Chunks stored per source.",
+         [({"source": s["source_id"], "active": str(s["active"])}, s["chunk_count"] or 0) for s in sources]),
+        ("rag_source_messages", "gauge", "Messages ingested per source.",
+         [({"source": s["source_id"]}, s["message_count"] or 0) for s in sources]),
+    ]
+
+register_collector(source_metrics)
+
+async def save_upload(upload_file):
+    """
+    Streams the upload to data/raw in fixed-size blocks, hashing as it goes.
+    The file is written under a temporary name and renamed into place, so a
+    half-written upload never replaces an existing export. An upload whose
+    content is already a registered source is deleted instead of renamed;
+    the ingest job then reports it as a duplicate.
+    Returns (file_path, sha256 hex digest).
+    """
     os.makedirs(RAW_DIR, exist_ok=True)
 
     file_path = os.path.join(RAW_DIR, upload_file.filename)
+    tmp_path = f"{file_path}.{uuid4().hex}.part"
+    digest = hashlib.sha256()
 
-    with open(file_path, "wb") as f:
-        f.write(await upload_file.read())
-    
-    file_name = Path(file_path).stem
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                block = await upload_file.read(UPLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                f.write(block)
+        content_hash = digest.hexdigest()
+        if find_source_by_hash(content_hash) is None:
+            os.replace(tmp_path, file_path)
+        else:
+            os.remove(tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
-    print(f"Ingestion started for {file_name}")
-    start = time.time()
-    print("parsing started")
-    messages = parse_whatsapp_chat(file_path,file_name)
-    print("Parsing time:", time.time() - start)
+    return file_path, content_hash
 
-    start = time.time()
-    print("chunking started")
-    chunks = create_chunks(messages, file_name)
-    print("Chunking time:", time.time() - start)
+def duplicate_result(file_path, content_hash):
+    existing = find_source_by_hash(content_hash) if content_hash else None
+    if existing is None:
+        return None
 
-    texts = [chunk["text"] for chunk in chunks]
+    print(f"{os.path.basename(file_path)} is identical to source {existing['source_id']}, skipping")
+    INGEST_FILES.inc(outcome="duplicate")
+    return {
+        "file": os.path.basename(file_path),
+        "chunks_added": 0,
+        "duplicate_of": existing["source_id"]
+    }
+
+def source_watermark(source_id):
+    source = get_source(source_id)
+    if source and source["last_message_ts"]:
+        return datetime.fromisoformat(source["last_message_ts"]), source["last_message_hash"]
+    return None
 
-    start = time.time()
-    print("embedding started")
-    embeddings = embedder.encode(texts)
-    print("Embedding time:", time.time() - start)
+def observe_build(built):
+    # timings come back from build_chunks, so this also covers worker processes
+    for stage, seconds in built["timings"].items():
+        INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+    INGEST_MESSAGES.inc(sum(chunk["message_count"] for chunk in built["chunks"]))
 
+def build_stats(file_path, built):
+    """per-source stats for the registry; store_chunks adds its own time"""
+    return {
+        "bytes": os.path.getsize(file_path),
+        "message_count": sum(chunk["message_count"] for chunk in built["chunks"]),
+        "ingest_seconds": sum(built["timings"].values())
+    }
+
+def store_chunks(file_name, chunks, embeddings, content_hash=None, watermark=None, report=no_report, stats=None):
+    texts = [chunk["text"] for chunk in chunks]
     metadatas = []
     ids = []
 
@@ -52,34 +124,189 @@ async def ingest_file(upload_file):
             "sender_id": chunk["sender_id"],
             "start_time": chunk["start_time"].isoformat(),
             "end_time": chunk["end_time"].isoformat(),
+            "start_ts": to_epoch(chunk["start_time"]),
+            "end_ts": to_epoch(chunk["end_time"]),
             "message_count": chunk["message_count"]
         })
 
-    vectordb = VectorDB(COLLECTION_NAME, PERSIST_DIR)
+    # jobs may build chunks in parallel, but only one writes at a time
+    with write_lock:
+        vectordb = open_vectordb(COLLECTION_NAME, PERSIST_DIR)
+
+        report("upsert", 0.6)
+        start = time.time()
+        print("inserting into vectordb")
+
+        for i in range(0, len(texts), BATCH_SIZE):
+            batch_texts = texts[i:i+BATCH_SIZE]
+            batch_ids = ids[i:i+BATCH_SIZE]
+            batch_metadata = metadatas[i:i+BATCH_SIZE]
+            batch_embeddings = embeddings[i:i+BATCH_SIZE]
+
+            vectordb.upsert(
+                ids=batch_ids,
+                documents=batch_texts,
+                embeddings=batch_embeddings,
+                metadatas=batch_metadata
+            )
+            report("upsert", 0.6 + 0.35 * min(i + BATCH_SIZE, len(texts)) / len(texts))
+
+        upsert_seconds = time.time() - start
+        print("Vector insert time:", upsert_seconds)
+        INGEST_STAGE_SECONDS.observe(upsert_seconds, stage="upsert")
+        INGEST_CHUNKS.inc(len(chunks))
+
+        if stats is not None:
+            stats = {**stats, "ingest_seconds": stats.get("ingest_seconds", 0.0) + upsert_seconds}
+
+        report("register", 0.95)
+        add_source(file_name, len(chunks), content_hash, watermark, stats)
+        INGEST_FILES.inc(outcome="ingested")
+
+def backfill_time_metadata(job=None):
+    """
+    Adds start_ts/end_ts to chunks stored before they existed, so
+    date-scoped questions also reach older sources. Scans the whole
+    collection under write_lock; run it once after upgrading:
 
-    start = time.time()
-    print("inserting into vectordb")
-    BATCH_SIZE = 2000
+        python -m backend.services.ingestion_service backfill-time-metadata
+    """
+    updated = 0
+    with write_lock:
+        vectordb = open_vectordb(COLLECTION_NAME, PERSIST_DIR)
 
-    for i in range(0, len(texts), BATCH_SIZE):
-        batch_texts = texts[i:i+BATCH_SIZE]
-        batch_ids = ids[i:i+BATCH_SIZE]
-        batch_metadata = metadatas[i:i+BATCH_SIZE]
+        # one update per source: the sharded store rewrites a whole shard
+        # per update_metadatas call, so per-page updates would be quadratic
+        pending_source, pending_ids, pending = None, [], []
+        for ids, metadatas in vectordb.iter_metadatas(BATCH_SIZE):
+            for chunk_id, meta in zip(ids, metadatas):
+                if "start_ts" in meta:
+                    continue
+                if meta.get("source") != pending_source and pending_ids:
+                    vectordb.update_metadatas(pending_ids, pending)
+                    updated += len(pending_ids)
+                    pending_ids, pending = [], []
+                pending_source = meta.get("source")
+                meta["start_ts"] = to_epoch(datetime.fromisoformat(meta["start_time"]))
+                meta["end_ts"] = to_epoch(datetime.fromisoformat(meta["end_time"]))
+                pending_ids.append(chunk_id)
+                pending.append(meta)
+        if pending_ids:
+            vectordb.update_metadatas(pending_ids, pending)
+            updated += len(pending_ids)
 
-        batch_embeddings = embedder.encode(batch_texts)
+    if updated:
+        print(f"Added time metadata to {updated} chunks")
+    return {"chunks_updated": updated}
 
-        vectordb.upsert(
-            ids=batch_ids,
-            documents=batch_texts,
-            embeddings=batch_embeddings,
-            metadatas=batch_metadata
-        )
+def ingest_path(file_path, content_hash=None, report=no_report):
+    """
+    Parses, chunks, embeds and stores one saved export. Runs synchronously;
+    report(stage, fraction) is called as the file moves through the stages.
+    An export whose content hash is already registered is skipped.
+    """
+    duplicate = duplicate_result(file_path, content_hash)
+    if duplicate:
+        return duplicate
 
-    print("Vector insert time:", time.time() - start)
-    
-    add_source(file_name, len(chunks))
+    watermark = source_watermark(Path(file_path).stem)
+    if watermark:
+        print(f"Resuming after message {watermark[1]} at {watermark[0].isoformat()}")
+
+    built = build_chunks(file_path, encode=embedder.encode, watermark=watermark, report=report)
+    observe_build(built)
+    store_chunks(built["file_name"], built["chunks"], built["embeddings"], content_hash, built["watermark"], report,
+                 build_stats(file_path, built))
 
     return{
-        "file": upload_file.filename,
-        "chunks_added": len(chunks)
+        "file": os.path.basename(file_path),
+        "chunks_added": len(built["chunks"])
     }
+
+def ingest_paths_parallel(job, uploads):
+    """
+    Builds chunks for several files at once in a process pool. Each worker
+    gets an equal share of the cores for its torch threads; the vector
+    writes stay in this thread, one file at a time.
+    """
+    results = {}
+    pending = {}
+    seen_hashes = {}
+
+    for file_path, content_hash in uploads:
+        duplicate = duplicate_result(file_path, content_hash)
+        if duplicate is None and content_hash in seen_hashes:
+            # same content twice in one upload
+            duplicate = {
+                "file": os.path.basename(file_path),
+                "chunks_added": 0,
+                "duplicate_of": seen_hashes[content_hash]
+            }
+            INGEST_FILES.inc(outcome="duplicate")
+        if duplicate:
+            results[file_path] = duplicate
+        else:
+            pending[file_path] = content_hash
+            seen_hashes[content_hash] = Path(file_path).stem
+
+    if not pending:
+        return [results[path] for path, _ in uploads]
+
+    workers = min(INGEST_PROCESSES, len(pending))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    job.update(stage="build", progress=0.0)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=init_worker,
+        initargs=(threads, sender_map_lock)
+    ) as pool:
+        futures = {
+            pool.submit(build_chunks_in_worker, path, source_watermark(Path(path).stem)): path
+            for path in pending
+        }
+
+        for done, future in enumerate(as_completed(futures)):
+            file_path = futures[future]
+            built = future.result()
+
+            observe_build(built)
+            store_chunks(built["file_name"], built["chunks"], built["embeddings"], pending[file_path], built["watermark"],
+                         stats=build_stats(file_path, built))
+
+            results[file_path] = {
+                "file": os.path.basename(file_path),
+                "chunks_added": len(built["chunks"])
+            }
+            job.update(stage="build", progress=(done + 1) / len(pending))
+
+    return [results[path] for path, _ in uploads]
+
+def run_ingest_job(job, uploads):
+    if INGEST_PROCESSES > 1 and len(uploads) > 1:
+        return {"status": "completed", "results": ingest_paths_parallel(job, uploads)}
+
+    results = []
+
+    for idx, (file_path, content_hash) in enumerate(uploads):
+        def report(stage, fraction, idx=idx):
+            job.update(stage=stage, progress=(idx + fraction) / len(uploads))
+
+        results.append(ingest_path(file_path, content_hash, report))
+
+    return {"status": "completed", "results": results}
+
+def submit_ingest_job(uploads):
+    """uploads: list of (file_path, content_hash) from save_upload"""
+    return submit_job("ingest", run_ingest_job, uploads)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["backfill-time-metadata"]:
+        print(backfill_time_metadata())
+    else:
+        print("usage: python -m backend.services.ingestion_service backfill-time-metadata")
+        sys.exit(2)
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from uuid import uuid4
+from rag.metrics import register_collector
+
+# one worker keeps writes to the shared collection sequential
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+MAX_FINISHED_JOBS = 200
+
+executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self, kind):
+        self.job_id = str(uuid4())
+        self.kind = kind
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.timings = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+
+        self._lock = threading.Lock()
+        self._stage_start = time.perf_counter()
+
+    def _close_stage(self):
+        elapsed = time.perf_counter() - self._stage_start
+        self.timings[self.stage] = self.timings.get(self.stage, 0.0) + elapsed
+
+    def update(self, stage=None, progress=None):
+        with self._lock:
+            if stage is not None and stage != self.stage:
+                self._close_stage()
+                self.stage = stage
+                self._stage_start = time.perf_counter()
+            if progress is not None:
+                self.progress = min(max(progress, 0.0), 1.0)
+
+    def finish(self, status, result=None, error=None):
+        with self._lock:
+            self._close_stage()
+            self.stage = "done"
+            self.status = status
+            self.result = result
+            self.error = error
+            if status == "completed":
+                self.progress = 1.0
+            self.finished_at = datetime.now().isoformat()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": round(self.progress, 4),
+                "timings": {k: round(v, 4) for k, v in self.timings.items()},
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at
+            }
+
+
+def _prune_finished():
+    finished = [job_id for job_id, job in _jobs.items() if job.status in ("completed", "failed")]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def _run(job, fn, args):
+    job.update(stage="starting")
+    job.status = "running"
+    try:
+        result = fn(job, *args)
+    except Exception as e:
+        traceback.print_exc()
+        job.finish("failed", error=str(e))
+    else:
+        job.finish("completed", result=result)
+
+
+def submit_job(kind, fn, *args):
+    """
+    Runs fn(job, *args) on the worker pool and returns the Job right away.
+    fn reports its stage and progress through job.update().
+    """
+    job = Job(kind)
+    with _jobs_lock:
+        _prune_finished()
+        _jobs[job.job_id] = job
+    executor.submit(_run, job, fn, args)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def job_metrics():
+    counts = {}
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.status in ("queued", "running"):
+                counts[(job.kind, job.status)] = counts.get((job.kind, job.status), 0) + 1
+    return [
+        ("rag_jobs_in_progress", "gauge", "Background jobs queued or running.",
+         [({"kind": kind, "status": status}, count) for (kind, status), count in counts.items()])
+    ]
+
+register_collector(job_metrics)
@@ -1,10 +1,25 @@
+import os
 import json
+from rag.chunking.preprocessing import SENDER_MAP_PATH, sender_map_lock
 from rag.retrieval.pipeline import pipeline
+from backend.services.registry_service import on_source_change, filter_active_sources
+from rag.metrics import QUERY_STAGE_SECONDS, QUERIES, QUERIES_IN_PROGRESS, register_cache
 
 COLLECTION_NAME = "whatsapp_chunks"
 PERSIST_DIR = "vector_store"
-with open("data/processed/sender_map.json", "r", encoding="utf-8") as f:
-    KNOWN_SENDERS = json.load(f)
+
+_sender_map_mtime = None
+
+def load_sender_map():
+    global _sender_map_mtime
+    if not os.path.exists(SENDER_MAP_PATH):
+        return {}
+    with sender_map_lock:
+        _sender_map_mtime = os.path.getmtime(SENDER_MAP_PATH)
+        with open(SENDER_MAP_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+KNOWN_SENDERS = load_sender_map()
 
 rag_pipeline = pipeline(
     known_senders=KNOWN_SENDERS,
@@ -12,15 +27,54 @@ rag_pipeline = pipeline(
     persist_dir=PERSIST_DIR
 )
 
+def reload_senders(source_id=None):
+    # ingestion adds new senders to sender_map.json while it parses, before it
+    # registers the source, so re-reading it here picks them up
+    if os.path.exists(SENDER_MAP_PATH) and os.path.getmtime(SENDER_MAP_PATH) == _sender_map_mtime:
+        return
+    added = rag_pipeline.search.parser.add_senders(load_sender_map())
+    if added:
+        print(f"Sender matcher: added {added} senders")
+
+on_source_change(reload_senders)
+if rag_pipeline.answer_cache is not None:
+    on_source_change(rag_pipeline.answer_cache.invalidate_source)
+    register_cache("answer", rag_pipeline.answer_cache.stats)
+register_cache("query_embedding", rag_pipeline.search.retriever.query_encoder.stats)
+
 def run_query(question, sources):
-    result = rag_pipeline.run(
-        user_query=question,
-        sources= sources,
-        top_k = 5
-    )
+    # deactivated or unknown sources are never searched
+    sources = filter_active_sources(sources)
+    with QUERIES_IN_PROGRESS.track_inprogress(endpoint="query"), QUERY_STAGE_SECONDS.time(stage="total"):
+        try:
+            result = rag_pipeline.run(
+                user_query=question,
+                sources= sources,
+                top_k = 5
+            )
+        except Exception:
+            QUERIES.inc(endpoint="query", outcome="error")
+            raise
+    QUERIES.inc(endpoint="query", outcome="ok")
 
     return{
         "parsed_query": result["parsed_query"],
         "answer": result["answer"],
         "retrieved_chunks":result["retrieved_chunks"]
-    }
\ No newline at end of file
+    }
+
+def stream_query(question, sources):
+    """Server-sent events: one "chunks" event, then "token" events, then "done"."""
+    sources = filter_active_sources(sources)
+    with QUERIES_IN_PROGRESS.track_inprogress(endpoint="stream"):
+        try:
+            for event, data in rag_pipeline.stream(user_query=question, sources=sources, top_k=5):
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except RuntimeError as e:
+            QUERIES.inc(endpoint="stream", outcome="error")
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+            return
+
+    QUERIES.inc(endpoint="stream", outcome="ok")
+
+    yield "event: done\ndata: {}\n\n"
@@ -46,71 +46,166 @@
 #     registry = [item for item in registry if item["source_id"]!=source_id]
 #     save_registry(registry)
 
+import threading
 from datetime import datetime
-from backend.services.db import get_connection
+from backend.services.db import connection
+
+# callbacks run with the source_id after any write that changes what a
+# source contributes to answers (ingest, deactivate, reactivate, delete)
+_source_change_listeners = []
+
+def on_source_change(callback):
+    _source_change_listeners.append(callback)
+
+def notify_source_change(source_id):
+    invalidate_source_cache()
+    for callback in _source_change_listeners:
+        callback(source_id)
+
+# In-memory view of the sources table for the query path and GET /sources.
+# Every registry write goes through notify_source_change, which drops it;
+# the next read reloads it with a single query.
+_source_cache = None
+_source_cache_lock = threading.Lock()
+
+def invalidate_source_cache():
+    global _source_cache
+    with _source_cache_lock:
+        _source_cache = None
+
+def _cached_view():
+    global _source_cache
+    with _source_cache_lock:
+        if _source_cache is None:
+            rows = load_registry()
+            _source_cache = {
+                "sources": rows,
+                "active": frozenset(row["source_id"] for row in rows if row["active"])
+            }
+        return _source_cache
+
+def active_source_ids():
+    return _cached_view()["active"]
+
+def filter_active_sources(sources):
+    active = active_source_ids()
+    return [source for source in sources or [] if source in active]
 
 def load_registry():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("select * from sources")
-    rows = cursor.fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("select * from sources").fetchall()
 
     return [dict(row) for row in rows]
 
-def add_source(source_id, chunk_count):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        INSERT INTO sources
-        (source_id, chunk_count, active, created_at)
-        VALUES (?, ?, ?, ?)
-        """,
-        (
-            source_id,
-            chunk_count,
-            1,
-            datetime.now().isoformat(),
-        ),
-    )
-    conn.commit()
-    conn.close()
+UPSERT_SOURCE = """
+    INSERT INTO sources
+    (source_id, chunk_count, active, created_at, content_hash, last_message_ts, last_message_hash,
+     bytes, message_count, ingest_seconds, updated_at)
+    VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(source_id) DO UPDATE SET
+        chunk_count = chunk_count + excluded.chunk_count,
+        content_hash = COALESCE(excluded.content_hash, content_hash),
+        last_message_ts = COALESCE(excluded.last_message_ts, last_message_ts),
+        last_message_hash = COALESCE(excluded.last_message_hash, last_message_hash),
+        bytes = CASE WHEN excluded.bytes > 0 THEN excluded.bytes ELSE bytes END,
+        message_count = message_count + excluded.message_count,
+        ingest_seconds = ingest_seconds + excluded.ingest_seconds,
+        updated_at = excluded.updated_at
+"""
+
+def add_sources(records):
+    """
+    Registers or updates many sources in one transaction. Each record is a
+    dict with source_id and chunk_count, and optionally content_hash,
+    watermark, bytes, message_count and ingest_seconds.
+    """
+    now = datetime.now().isoformat()
+    rows = []
+    for record in records:
+        watermark = record.get("watermark")
+        last_ts, last_hash = (watermark[0].isoformat(), watermark[1]) if watermark else (None, None)
+        rows.append((
+            record["source_id"],
+            record["chunk_count"],
+            now,
+            record.get("content_hash"),
+            last_ts,
+            last_hash,
+            record.get("bytes", 0),
+            record.get("message_count", 0),
+            record.get("ingest_seconds", 0.0),
+            now,
+        ))
+
+    with connection() as conn:
+        conn.executemany(UPSERT_SOURCE, rows)
+
+    for row in rows:
+        notify_source_change(row[0])
+
+def add_source(source_id, chunk_count, content_hash=None, watermark=None, stats=None):
+    """
+    Registers a source, or adds to it when the source was ingested before
+    (a re-export of the same chat). watermark is the (timestamp, hash) of
+    the last message ingested, or None to keep the stored one. stats may
+    hold bytes (size of the latest export), message_count and
+    ingest_seconds; the last two accumulate across re-ingests.
+    """
+    add_sources([{
+        "source_id": source_id,
+        "chunk_count": chunk_count,
+        "content_hash": content_hash,
+        "watermark": watermark,
+        **(stats or {})
+    }])
+
+def get_source(source_id):
+    with connection() as conn:
+        row = conn.execute(
+            "select * from sources where source_id = ?",
+            (source_id,),
+        ).fetchone()
+
+    return dict(row) if row else None
+
+def find_source_by_hash(content_hash):
+    with connection() as conn:
+        row = conn.execute(
+            "select * from sources where content_hash = ? limit 1",
+            (content_hash,),
+        ).fetchone()
+
+    return dict(row) if row else None
 
 def list_sources():
-    return load_registry()
+    return [dict(row) for row in _cached_view()["sources"]]
 
-def deactivate_source(source_id):
-    conn = get_connection()
-    cursor = conn.cursor()
+def set_sources_active(source_ids, active):
+    now = datetime.now().isoformat()
+    with connection() as conn:
+        conn.executemany(
+            "update sources set active = ?, updated_at = ? where source_id = ?",
+            [(int(active), now, source_id) for source_id in source_ids],
+        )
 
-    cursor.execute(
-        "update sources set active=0 where source_id = ?",
-        (source_id,),
-    )
-    conn.commit()
-    conn.close()
+    for source_id in source_ids:
+        notify_source_change(source_id)
+
+def deactivate_source(source_id):
+    set_sources_active([source_id], False)
 
 def reactivate_source(source_id):
-    conn = get_connection()
-    cursor = conn.cursor()
+    set_sources_active([source_id], True)
+
+def delete_sources(source_ids):
+    with connection() as conn:
+        conn.executemany(
+            "delete from sources where source_id = ?",
+            [(source_id,) for source_id in source_ids],
+        )
 
-    cursor.execute(
-        "update sources set active=1 where source_id = ?",
-        (source_id,),
-    )
-    conn.commit()
-    conn.close()
+    for source_id in source_ids:
+        notify_source_change(source_id)
 
 def delete_source(source_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "delete from sources where source_id = ?",
-        (source_id,),
-    )
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    delete_sources([source_id])
@@ -1,21 +1,129 @@
-from rag.ingestion.vectordb import VectorDB
-from backend.services.source_service import (
-    deactivate_source,
-    reactivate_source,
-    delete_source
-)
+import os
+import glob
+import time
+import sqlite3
+from pathlib import Path
+from backend.services.ingestion_service import write_lock, COLLECTION_NAME, PERSIST_DIR, RAW_DIR
+from backend.services.job_service import submit_job
+from backend.services.registry_service import get_source, set_sources_active, delete_source
+from rag.ingestion.vectordb import open_vectordb
 
-vectordb = VectorDB()
+# vectors deleted per write_lock hold, so ingests can interleave with a purge
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "5000"))
+CHROMA_SQLITE = os.path.join(PERSIST_DIR, "chroma.sqlite3")
+# compact after a purge only once this share of the file is free pages;
+# above 1 turns compaction off
+COMPACT_FREE_RATIO = float(os.getenv("COMPACT_FREE_RATIO", "0.3"))
 
-def deactivate(source_id):
-    deactivate_source(source_id)
+def source_files(source_id):
+    """raw export and the intermediate files ingestion wrote for a source"""
+    # exact stem only: "family" must not take "family.2024.txt" (another
+    # source) or an upload still being written as "<name>.<uuid>.part"
+    paths = [
+        path for path in glob.glob(os.path.join(glob.escape(RAW_DIR), glob.escape(source_id) + ".*"))
+        if Path(path).stem == source_id and not path.endswith(".part")
+    ]
+    paths += [
+        f"data/processed/{source_id}_messages.json",
+        f"data/processed/{source_id}_noise_messages.json",
+        f"data/chunks/{source_id}_chunks.json",
+    ]
+    return [path for path in paths if os.path.isfile(path)]
 
-def reactivate(source_id):
-    reactivate_source(source_id)
+def delete_vectors(source_id, expected=0, report=lambda fraction: None):
+    vectordb = open_vectordb(COLLECTION_NAME, PERSIST_DIR)
+    if hasattr(vectordb, "drop_source"):
+        # per-source backends remove the whole partition at once
+        with write_lock:
+            deleted = vectordb.drop_source(source_id)
+        report(1.0)
+        return deleted
 
-def delete(source_id):
-    vectordb.collection.delete( where={"source":source_id})
+    deleted = 0
+
+    while True:
+        with write_lock:
+            ids = vectordb.ids_where({"source": source_id}, PURGE_BATCH_SIZE)
+            if not ids:
+                break
+            vectordb.delete(ids)
+        deleted += len(ids)
+        report(min(deleted / expected, 1.0) if expected else 0.0)
+
+    return deleted
+
+def free_page_ratio():
+    """share of Chroma's sqlite file that deletes have left unused"""
+    conn = sqlite3.connect(CHROMA_SQLITE, timeout=1)
+    try:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        total = conn.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        conn.close()
+    return free / total if total else 0.0
+
+def compact_store():
+    """
+    VACUUMs Chroma's sqlite file once at least COMPACT_FREE_RATIO of it is
+    free pages. VACUUM rewrites the whole file under write_lock, so it is
+    skipped for small purges and when Chroma is busy.
+    """
+    if not os.path.exists(CHROMA_SQLITE):
+        return False
+    try:
+        ratio = free_page_ratio()
+    except sqlite3.OperationalError as e:
+        print(f"Skipping vector store compaction: {e}")
+        return False
+    if ratio < COMPACT_FREE_RATIO:
+        return False
+
+    with write_lock:
+        try:
+            conn = sqlite3.connect(CHROMA_SQLITE, timeout=1)
+            conn.execute("VACUUM")
+            conn.close()
+        except sqlite3.OperationalError as e:
+            print(f"Skipping vector store compaction: {e}")
+            return False
+    print(f"Compacted vector store ({ratio:.0%} free pages)")
+    return True
+
+def purge_source(job, source_id):
+    """
+    Removes a source everywhere: its vectors (in batches, reporting
+    progress on the job), its raw and intermediate files and its
+    registry row. The source is deactivated first, so queries stop
+    searching it right away.
+    """
+    source = get_source(source_id)
+    set_sources_active([source_id], False)
+
+    start = time.time()
+    job.update(stage="delete_vectors", progress=0.0)
+    deleted = delete_vectors(
+        source_id,
+        expected=source["chunk_count"] if source else 0,
+        report=lambda fraction: job.update(progress=0.9 * fraction)
+    )
+    print(f"Deleted {deleted} vectors of {source_id} in {time.time() - start:.2f}s")
+
+    job.update(stage="delete_files", progress=0.9)
+    files = source_files(source_id)
+    for path in files:
+        os.remove(path)
 
     delete_source(source_id)
 
-    return {"deleted_source": source_id}
\ No newline at end of file
+    job.update(stage="compact", progress=0.95)
+    compacted = compact_store()
+
+    return {
+        "deleted_source": source_id,
+        "vectors_deleted": deleted,
+        "files_deleted": files,
+        "compacted": compacted
+    }
+
+def submit_purge_job(source_id):
+    return submit_job("purge", purge_source, source_id)
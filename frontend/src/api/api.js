@@ -23,9 +23,37 @@ export async function uploadChats(files){
         body: formData,
     });
 
+    const { job_id } = await res.json();
+    return waitForIngestJob(job_id);
+}
+
+export async function getIngestJob(job_id){
+    const res = await fetch(`${baseURL}/ingest/jobs/${job_id}`);
+    return res.json();
+}
+
+export async function getSourceJob(job_id){
+    const res = await fetch(`${baseURL}/sources/jobs/${job_id}`);
     return res.json();
 }
 
+export async function waitForIngestJob(job_id, intervalMs = 1000){
+    return waitForJob(() => getIngestJob(job_id), intervalMs);
+}
+
+export async function waitForJob(fetchJob, intervalMs = 1000){
+    while (true) {
+        const job = await fetchJob();
+        if (job.status === "completed") {
+            return job.result;
+        }
+        if (job.status === "failed") {
+            throw new Error(job.error);
+        }
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+}
+
 export async function queryChats(question, sources){
     const res = await fetch(`${baseURL}/query/`, {
         method:"POST",
@@ -63,5 +91,6 @@ export async function deleteSource(source_id) {
     const res = await fetch(`${baseURL}/sources/${source_id}`, {
         method: "DELETE",
     });
-    return res.json();
+    const { job_id } = await res.json();
+    return waitForJob(() => getSourceJob(job_id));
 }
\ No newline at end of file
@@ -1,15 +1,14 @@
 import numpy as np
 import json
-from uuid import uuid4
+import hashlib
+from itertools import islice
+from uuid import UUID
 from datetime import timedelta
 from pathlib import Path
-from sklearn.metrics.pairwise import cosine_similarity
 
-import os
-os.environ["HF_HUB_OFFLINE"] = "1"
-from sentence_transformers import SentenceTransformer
-embedder = SentenceTransformer("all-MiniLm-L6-v2")
-print("Loaded Model completely offline")
+from rag.ingestion.embedder import Embedder
+# the model itself loads on first use and is shared with ingestion and retrieval
+embedder = Embedder()
 
 TIME_GAP_MINUTES = 30
 SIM_THRESHOLD = 0.65
@@ -21,31 +20,44 @@ SPLIT_SIZE = "max_size"
 SPLIT_SEMANTIC = "semantic_drift"
 SPLIT_START = "start"
 
-def check_time_gap(prev_ts, curr_ts, minutes = TIME_GAP_MINUTES):
-    return curr_ts-prev_ts>timedelta(minutes = minutes)
-
-def cosine_sim(v1,v2):
-    return cosine_similarity(v1.reshape(1,-1), v2.reshape(1,-1))[0][0]
-
-def create_new_chunk(msg, embedding, reason, similarity=None ):
-    return(
-        {
-            "chunk_id": str(uuid4()),
-            "sender_id": msg["sender_id"],
-            "start_time": msg["timestamp"],
-            "end_time": msg["timestamp"],
-            "message_ids": [msg["message_id"]],
-            "texts": [msg["message"].strip()],
-            "message_count": 1,
-            "split_reason": reason,
-            "split_similarity": similarity
-        },
-        [embedding]
-    )
+# messages tested per vectorised step inside a run of same-sender messages;
+# the window grows while no split is found and resets after every split
+MIN_WINDOW = 16
+MAX_WINDOW = 128
+
+# messages encoded and chunked per step, so callers can pass a generator
+# and never hold the whole chat in memory
+ENCODE_BATCH_SIZE = 4096
+
+def iter_batches(items, batch_size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def create_new_chunk(msg, msg_text, reason, similarity=None, source_id=""):
+    # the chunk id is derived from the source and the hashes of the messages
+    # it holds, so re-ingesting the same messages overwrites the same vectors
+    digest = hashlib.sha1(source_id.encode("utf-8"))
+    digest.update(msg["message_hash"].encode("ascii"))
+
+    return {
+        "digest": digest,
+        "sender_id": msg["sender_id"],
+        "start_time": msg["timestamp"],
+        "end_time": msg["timestamp"],
+        "message_ids": [msg["message_id"]],
+        "texts": [msg_text],
+        "message_count": 1,
+        "split_reason": reason,
+        "split_similarity": similarity
+    }
 
 def finalize_chunk(chunk):
     return {
-        "chunk_id": chunk["chunk_id"],
+        "chunk_id": str(UUID(bytes=chunk["digest"].digest()[:16])),
         "sender_id": chunk["sender_id"],
         "start_time": chunk["start_time"],
         "end_time": chunk["end_time"],
@@ -56,7 +68,7 @@ def finalize_chunk(chunk):
         "split_similarity": chunk["split_similarity"]
     }
 
-def write_chunks_json(chunks, output_path: str):
+def write_chunks_json(chunks, output_path: str, append: bool = False):
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok = True)
 
@@ -68,87 +80,177 @@ def write_chunks_json(chunks, output_path: str):
         chunk_copy["split_similarity"] = float(chunk_copy["split_similarity"]) if chunk_copy["split_similarity"] is not None else None
         chunks_copy.append(chunk_copy)
 
+    if append and output_path.exists():
+        with output_path.open("r", encoding="utf-8") as f:
+            chunks_copy = json.load(f) + chunks_copy
+
     with output_path.open("w", encoding="utf-8") as f:
         json.dump(chunks_copy, f, ensure_ascii=False, indent=2)
 
-def create_chunks(messages, file_name: str):
-    chunks = []
-    current_chunk = None
-    current_embeddings = []
-
-    message_texts = [msg["message"].strip() for msg in messages]
-    all_embeddings = embedder.encode(message_texts)
-
-    prev_msg_ts = None
-
-    for msg, msg_embedding in zip(messages, all_embeddings):
-        msg_text = msg["message"].strip()
-        msg_ts = msg["timestamp"]
-        msg_sender = msg["sender_id"]
-
-        #embedding
-        # msg_embedding = embedder.encode( msg_text )
-
-        if current_chunk is None:
-            current_chunk = {
-                "chunk_id": str(uuid4()),
-                "sender_id": msg_sender,
-                "start_time": msg_ts,
-                "end_time": msg_ts,
-                "message_ids": [msg["message_id"]],
-                "texts": [msg_text],
-                "message_count": 1,
-                "split_reason": SPLIT_START,
-                "split_similarity": None
-            }
-            current_embeddings = [msg_embedding]
-            prev_msg_ts = msg_ts
-            continue
-
-        if msg_sender != current_chunk["sender_id"]:
-            chunks.append(finalize_chunk(current_chunk))
-            current_chunk, current_embeddings = create_new_chunk(
-                msg, msg_embedding, SPLIT_SENDER
-            )
-            prev_msg_ts = msg_ts
-            continue
-
-        if check_time_gap(prev_msg_ts, msg_ts):
-            chunks.append(finalize_chunk(current_chunk))
-            current_chunk, current_embeddings = create_new_chunk(
-                msg, msg_embedding, SPLIT_TIME
-            )
-            prev_msg_ts = msg_ts
-            continue
-
-        if sum(len(t) for t in current_chunk["texts"]) + len(msg_text) > MAX_CHARS:
-            chunks.append(finalize_chunk(current_chunk))
-            current_chunk, current_embeddings = create_new_chunk(
-                msg, msg_embedding, SPLIT_SIZE
-            )
-            prev_msg_ts = msg_ts
-            continue
-
-
-        chunk_centroid = np.mean(current_embeddings,axis = 0)
-        similarity = cosine_sim(msg_embedding,chunk_centroid)
-
-        if similarity< SIM_THRESHOLD:
-            chunks.append(finalize_chunk(current_chunk,))
-            current_chunk,current_embeddings = create_new_chunk(msg,msg_embedding,reason=SPLIT_SEMANTIC, similarity = similarity)
-        else:
-            current_chunk["texts"].append(msg_text)
-            current_chunk["message_ids"].append(msg["message_id"])
-            current_chunk["message_count"]+=1
-            current_chunk["end_time"] = msg_ts
-            current_embeddings.append(msg_embedding)
-
-        prev_msg_ts = msg_ts
-    
-    if current_chunk:
-        chunks.append(finalize_chunk(current_chunk))
+class SemanticChunker:
+    """
+    Incremental semantic-drift chunker.
+
+    Keeps a running embedding sum and character count for the open chunk, so
+    the centroid similarity and size checks cost O(1) per message. Sender and
+    time-gap boundaries are found for the whole batch at once, and the
+    similarities inside a run of same-sender messages are computed a window
+    at a time. Batches can be fed one after another; state carries over.
+
+    With keep_centroids, the normalised sum of each closed chunk is kept
+    (as float32) and returned by finish() alongside the chunks.
+    """
+
+    def __init__(self, source_id="", time_gap_minutes=TIME_GAP_MINUTES, sim_threshold=SIM_THRESHOLD, max_chars=MAX_CHARS,
+                 keep_centroids=False):
+        self.source_id = source_id
+        self.time_gap = timedelta(minutes=time_gap_minutes)
+        self.sim_threshold = sim_threshold
+        self.max_chars = max_chars
+        self.keep_centroids = keep_centroids
+
+        self.chunks = []
+        self.centroids = []
+
+        self._current = None
+        self._sum = None
+        self._chars = 0
+        self._prev_sender = None
+        self._prev_ts = None
+
+    def _start(self, msg, msg_text, embedding, reason, similarity=None):
+        if self._current is not None:
+            self._close()
+        self._current = create_new_chunk(msg, msg_text, reason, similarity, self.source_id)
+        self._sum = embedding.astype(np.float64)
+        self._chars = len(msg_text)
+
+    def _close(self):
+        self.chunks.append(finalize_chunk(self._current))
+        if self.keep_centroids:
+            norm = np.linalg.norm(self._sum)
+            centroid = self._sum / norm if norm > 0 else self._sum
+            self.centroids.append(centroid.astype(np.float32))
+        self._current = None
+
+    def _append(self, messages, texts, start, end):
+        if start == end:
+            return
+        chunk = self._current
+        chunk["texts"].extend(texts[start:end])
+        chunk["message_ids"].extend(msg["message_id"] for msg in messages[start:end])
+        chunk["digest"].update("".join(msg["message_hash"] for msg in messages[start:end]).encode("ascii"))
+        chunk["message_count"] += end - start
+        chunk["end_time"] = messages[end - 1]["timestamp"]
+
+    def _extend(self, messages, texts, embeddings, lengths, norms, i, end):
+        # messages i..end-1 share the open chunk's sender with no time gap,
+        # so only the size and semantic checks can split them
+        window = MIN_WINDOW
+        while i < end:
+            j = min(end, i + window)
+            block = embeddings[i:j]
+
+            running = np.cumsum(block, axis=0, dtype=np.float64)
+            sums = self._sum + running - block
+            chars = self._chars + np.cumsum(lengths[i:j])
+
+            dots = np.einsum("ij,ij->i", sums, block)
+            denom = np.sqrt(np.einsum("ij,ij->i", sums, sums)) * norms[i:j]
+            sims = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+            over = chars > self.max_chars
+            hits = np.flatnonzero(over | (sims < self.sim_threshold))
+
+            if hits.size == 0:
+                self._append(messages, texts, i, j)
+                self._sum = self._sum + running[-1]
+                self._chars = int(chars[-1])
+                i = j
+                window = min(window * 2, MAX_WINDOW)
+                continue
+
+            k = int(hits[0])
+            pos = i + k
+            self._append(messages, texts, i, pos)
+            self._sum = sums[k]
+            if over[k]:
+                self._start(messages[pos], texts[pos], embeddings[pos], SPLIT_SIZE)
+            else:
+                self._start(messages[pos], texts[pos], embeddings[pos], SPLIT_SEMANTIC, float(sims[k]))
+            i = pos + 1
+            window = MIN_WINDOW
+
+        return i
+
+    def feed(self, messages, embeddings):
+        n = len(messages)
+        if n == 0:
+            return
+
+        embeddings = np.asarray(embeddings)
+        texts = [msg["message"].strip() for msg in messages]
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=n)
+        norms = np.linalg.norm(embeddings, axis=1)
+
+        senders = [msg["sender_id"] for msg in messages]
+        stamps = [msg["timestamp"] for msg in messages]
+
+        # a chunk always holds one sender, so comparing with the previous
+        # message is the same as comparing with the open chunk
+        sender_split = np.fromiter(
+            (a != b for a, b in zip(senders, [self._prev_sender] + senders[:-1])),
+            dtype=bool, count=n
+        )
+        time_split = np.fromiter(
+            (prev is not None and curr - prev > self.time_gap
+             for curr, prev in zip(stamps, [self._prev_ts] + stamps[:-1])),
+            dtype=bool, count=n
+        )
+
+        hard = np.flatnonzero(sender_split | time_split)
+        hard_set = set(hard.tolist())
+
+        i = 0
+        while i < n:
+            if self._current is None:
+                self._start(messages[i], texts[i], embeddings[i], SPLIT_START)
+                i += 1
+            elif i in hard_set:
+                reason = SPLIT_SENDER if sender_split[i] else SPLIT_TIME
+                self._start(messages[i], texts[i], embeddings[i], reason)
+                i += 1
+            else:
+                nxt = np.searchsorted(hard, i, side="right")
+                end = int(hard[nxt]) if nxt < hard.size else n
+                i = self._extend(messages, texts, embeddings, lengths, norms, i, end)
+
+        self._prev_sender = senders[-1]
+        self._prev_ts = stamps[-1]
+
+    def finish(self):
+        if self._current is not None:
+            self._close()
+        return self.chunks, self.centroids
+
+def create_chunks(messages, file_name: str, return_centroids: bool = False, append: bool = False):
+    """
+    append adds the chunks to the file's existing chunks JSON, for a resumed
+    ingest whose messages continue an already-chunked source.
+    """
+    chunker = SemanticChunker(source_id=file_name, keep_centroids=return_centroids)
+
+    for batch in iter_batches(messages, ENCODE_BATCH_SIZE):
+        message_texts = [msg["message"].strip() for msg in batch]
+        chunker.feed(batch, embedder.encode_array(message_texts))
+
+    chunks, centroids = chunker.finish()
     
-    write_chunks_json(chunks, f"data/chunks/{file_name}_chunks.json")
+    if chunks or not append:
+        write_chunks_json(chunks, f"data/chunks/{file_name}_chunks.json", append)
+
+    if return_centroids:
+        # normalised mean of the message embeddings, usable as the chunk vector
+        return chunks, centroids
     
     return chunks
-
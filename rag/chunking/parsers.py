@@ -1,80 +1,159 @@
 import re
 from datetime import datetime
 
-# Format A: [date, time] Sender: message
-FORMAT_A_RE = re.compile(
-    r'^\[(\d{1,2}/\d{1,2}/\d{2}),\s([\d:]+\s[AP]M)\]\s(.+?):\s(.*)'
-)
+# ---------------------------------------------------------------------------
+# Format-sniffing lexer
+#
+# The export format is detected once per file from its first lines, then each
+# line goes through one anchored regex and a cached timestamp decoder instead
+# of several searches and strptime calls. To support another locale, add an
+# entry to LINE_FORMATS; every pattern must expose the same named groups in
+# the same order: date, hour, minute, second, ampm, sender, text.
+# ---------------------------------------------------------------------------
 
-# Format B: date, time - Sender: message  OR system message
-FORMAT_B_RE = re.compile(
-    r'^(\d{1,2}/\d{1,2}/\d{2,4}),\s([\d:]+\s?(?:AM|PM|am|pm))\s-\s(.*)',
-    re.IGNORECASE
+DATE_PATTERN = r'(?P<date>\d{1,2}[/.]\d{1,2}[/.](?:\d{4}|\d{2}))'
+TIME_PATTERN = (
+    r'(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?'
+    r'(?:\s?(?P<ampm>[AaPp][Mm]))?'
 )
 
+LINE_FORMATS = {
+    # iOS: [date, time] Sender: message
+    "ios": re.compile(
+        r'^\u200e?\[' + DATE_PATTERN + r',\s' + TIME_PATTERN +
+        r'\]\s(?P<sender>.+?):\s(?P<text>.*)$'
+    ),
+    # Android: date, time - Sender: message  OR system message
+    "android": re.compile(
+        r'^\u200e?' + DATE_PATTERN + r',\s' + TIME_PATTERN +
+        r'\s-\s(?:(?P<sender>[^:]*):)?(?P<text>.*)$'
+    ),
+}
+
+SNIFF_LINES = 200
+
+DATE_SPLIT_RE = re.compile(r'[/.]')
 
+# first characters a message-start line can have, used to skip the fallback
+# formats cheaply for ordinary continuation lines
+START_CHARS = frozenset("[\u200e0123456789")
 
-def parse_messages_start(line: str):
+
+class TimestampDecoder:
     """
-    Returns:
-      None → continuation line
-      dict → new message fields
+    Builds datetimes straight from the regex groups, caching the decoded
+    (year, month, day) per distinct date string.
+
+    day_first is what the first lines of the file showed. While it is None,
+    the old per-line rule applies (times with seconds are month-first, times
+    without are day-first) until the first date with a part over 12 settles
+    the order. A date that does not decode in the settled order switches it,
+    so a misleading head only costs the lines before the switch.
     """
 
-    #for format A
-    m = FORMAT_A_RE.match(line)
-    if m:
-        date,time,sender,text = m.groups()
-        return {
-            "date": date,
-            "time": time,
-            "sender": sender,
-            "text": text,
-            "format": "A"
-        }
-    
-    m = FORMAT_B_RE.match(line)
-    if m:
-        date,time,rest = m.groups()
-        if ":" in rest:
-            sender,text = rest.split(":", 1)
-            return {
-                "date": date,
-                "time": time,
-                "sender": sender.strip(),
-                "text": text.strip(),
-                "format": "B"
-            }
-        else:
-            return {
-                "date": date,
-                "time": time,
-                "sender": None,
-                "text": rest.strip(),
-                "format": "B"
-            }
-        
+    def __init__(self, day_first=None):
+        self.day_first = day_first
+        self._dates = {True: {}, False: {}}
+
+    def _decode_date(self, date_str, day_first):
+        cache = self._dates[day_first]
+        ymd = cache.get(date_str)
+        if ymd is None:
+            first, second, year_str = DATE_SPLIT_RE.split(date_str)
+            first, second, year = int(first), int(second), int(year_str)
+            if len(year_str) == 2:
+                # same pivot as strptime's %y
+                year += 2000 if year < 69 else 1900
+            if self.day_first is None and max(first, second) > 12:
+                self.day_first = day_first = first > 12
+                cache = self._dates[day_first]
+            if day_first:
+                day, month = first, second
+            else:
+                month, day = first, second
+            datetime(year, month, day)
+            ymd = (year, month, day)
+            cache[date_str] = ymd
+        return ymd
+
+    def decode(self, date_str, hour, minute, second, ampm):
+        day_first = self.day_first
+        if day_first is None:
+            day_first = second is None
+        try:
+            year, month, day = self._decode_date(date_str, day_first)
+        except ValueError:
+            year, month, day = self._decode_date(date_str, not day_first)
+            self.day_first = not day_first
+
+        h = int(hour)
+        if ampm:
+            if not 1 <= h <= 12:
+                raise ValueError(f"hour {hour} out of range for 12-hour clock")
+            h = h % 12 + (12 if ampm[0] in "pP" else 0)
+
+        return datetime(year, month, day, h, int(minute), int(second) if second else 0)
+
+
+def detect_day_first(matches):
+    firsts, seconds = [], []
+    for m in matches:
+        first, second, _ = DATE_SPLIT_RE.split(m.group("date"))
+        firsts.append(int(first))
+        seconds.append(int(second))
+
+    if any(v > 12 for v in firsts):
+        return True
+    if any(v > 12 for v in seconds):
+        return False
     return None
 
-def parse_timestamp(date_str, time_str):
-    time_str = time_str.upper().replace('\u202f', ' ').strip()
-    
-    # Determine year format based on length
-    parts = date_str.split('/')
-    if len(parts) == 3:
-        year = parts[2]
-        if len(year) == 4:
-            fmt_with_sec = "%m/%d/%Y %I:%M:%S %p"
-            fmt_without_sec = "%d/%m/%Y %I:%M %p"
-        else:
-            fmt_with_sec = "%m/%d/%y %I:%M:%S %p"
-            fmt_without_sec = "%d/%m/%y %I:%M %p"
-    else:
-        # Fallback, assume 2-digit year
-        fmt_with_sec = "%m/%d/%y %I:%M:%S %p"
-        fmt_without_sec = "%d/%m/%y %I:%M %p"
-    
-    try:
-        return datetime.strptime(f"{date_str} {time_str}", fmt_with_sec)
-    except ValueError:
-        return datetime.strptime(f"{date_str} {time_str}", fmt_without_sec)
\ No newline at end of file
+
+class ChatLexer:
+    def __init__(self, formats):
+        # formats: list of (name, regex, decoder), best match first
+        self.formats = formats
+        self.name, self._regex, self._decoder = formats[0]
+        self._fallbacks = formats[1:]
+
+    def parse(self, line: str):
+        """
+        Returns:
+          None → continuation line
+          (timestamp, sender, text) → start of a new message
+        """
+        m = self._regex.match(line)
+        decoder = self._decoder
+
+        if m is None:
+            if not line or line[0] not in START_CHARS:
+                return None
+            for _, regex, fallback_decoder in self._fallbacks:
+                m = regex.match(line)
+                if m is not None:
+                    decoder = fallback_decoder
+                    break
+            else:
+                return None
+
+        date_str, hour, minute, second, ampm, sender, text = m.groups()
+        timestamp = decoder.decode(date_str, hour, minute, second, ampm)
+        return timestamp, sender.strip() if sender is not None else None, text.strip()
+
+
+def sniff_format(lines) -> ChatLexer:
+    """
+    Picks the format matching most of the given lines and, from the dates
+    seen, whether it is day-first. Formats that did not match stay available
+    as fallbacks for mixed exports.
+    """
+    lines = [line.rstrip("\n") for line in lines]
+
+    ranked = []
+    for order, (name, regex) in enumerate(LINE_FORMATS.items()):
+        matches = [m for m in map(regex.match, lines) if m is not None]
+        decoder = TimestampDecoder(detect_day_first(matches) if matches else None)
+        ranked.append((-len(matches), order, name, regex, decoder))
+
+    ranked.sort()
+    return ChatLexer([(name, regex, decoder) for _, _, name, regex, decoder in ranked])
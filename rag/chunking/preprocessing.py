@@ -1,9 +1,14 @@
+import os
 import re
 import uuid
 import json
-from datetime import datetime
+import hashlib
+from collections import deque
+from datetime import datetime, timedelta
 from pathlib import Path
-from .parsers import parse_messages_start,parse_timestamp
+from itertools import chain, islice
+from multiprocessing import get_context
+from .parsers import sniff_format, SNIFF_LINES
 
 def detect_message_type(text: str) -> str:
     lowered = text.lower()
@@ -25,8 +30,9 @@ def detect_message_type(text: str) -> str:
     return "text"
 
 def get_sender_id(sender: str, mapping: dict) -> str:
+    # mapping caches the shared sender map; only new senders take the lock
     if sender not in mapping:
-        mapping[sender] = f"user_{len(mapping)+1:03d}"
+        mapping[sender] = assign_sender_id(sender)
     return mapping[sender]
 
 
@@ -43,159 +49,257 @@ SYSTEM_MESSAGE_RE = re.compile(
     r"|missed (voice|video) call"
     r"|changed (the subject|the group description|this group's icon)"
     r"|added|removed|left|joined)"
-    r"|(document|image) omitted",
-    re.IGNORECASE
+    r"|(document|image) omitted"
 )
 
 def is_system_message(message: str) -> bool:
-    message = message.replace("\u200e", "").replace("\u200f", "")
+    # lowercasing once is much cheaper than a case-insensitive scan
+    message = message.replace("\u200e", "").replace("\u200f", "").lower()
     return SYSTEM_MESSAGE_RE.search(message) is not None
 
+def is_noise_message(msg) -> bool:
+    return msg["is_system"] or msg["message_type"]=="reaction"
+
 def split_noise_messages(messages):
     noise_msg,normal_msg =[],[]
 
     for msg in messages:
-        if msg["is_system"] or msg["message_type"]=="reaction":
+        if is_noise_message(msg):
             noise_msg.append(msg)
         else:
             normal_msg.append(msg)
     
     return normal_msg,noise_msg
 
-def write_messages_json(messages, output_path: str):
-    output_path = Path(output_path)
-    output_path.parent.mkdir(parents=True, exist_ok = True)
+class JsonArrayWriter:
+    """
+    Writes a JSON array one item at a time, with the same layout as
+    json.dump(items, f, indent=2), so the full list never has to be in memory.
+    """
 
-    messages_copy = []
-    for msg in messages:
-        msg_copy = msg.copy()
-        msg_copy["timestamp"] = msg_copy["timestamp"].isoformat()
-        messages_copy.append(msg_copy)
+    def __init__(self, output_path: str):
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok = True)
+        self.f = output_path.open("w", encoding="utf-8")
+        self.count = 0
 
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(messages_copy, f, ensure_ascii=False, indent=2)
+    def write(self, item):
+        text = json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        self.f.write(("[\n  " if self.count == 0 else ",\n  ") + text)
+        self.count += 1
 
-# Format A: [date, time] Sender: message
-FORMAT_A_RE = re.compile(
-    r'\[(\d{1,2}/\d{1,2}/\d{2}),\s([\d:]+\s[AP]M)\]\s(.+?):\s(.*)'
-)
+    def close(self):
+        self.f.write("\n]" if self.count else "[]")
+        self.f.close()
 
-# Format B: date, time - Sender: message  OR system message
-FORMAT_B_RE = re.compile(
-    r'(\d{1,2}/\d{1,2}/\d{2}),\s([\d:]+\s?(?:am|pm))\s-\s(.*)',
-    re.IGNORECASE
-)
+    def __enter__(self):
+        return self
 
-def write_sender_map(sender_map: dict, output_path: str):
-    output_path = Path(output_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    # load existing sender map if it exists
-    if output_path.exists():
-        with output_path.open("r", encoding="utf-8") as f:
-            existing_map = json.load(f)
-    else:
-        existing_map = {}
-
-    # determine next available user id
-    if existing_map:
-        max_id = max(int(v.split("_")[1]) for v in existing_map.values())
-    else:
-        max_id = 0
-
-    # merge sender maps
-    for sender_name in sender_map:
-        if sender_name not in existing_map:
-            max_id += 1
-            existing_map[sender_name] = f"user_{max_id:03d}"
-
-    # write merged map
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(existing_map, f, ensure_ascii=False, indent=2)
+    def __exit__(self, *exc):
+        self.close()
 
-def parse_whatsapp_chat(file_path: str, file_name:str):
-    messages = []
-    sender_map = {}
+def message_to_json(msg):
+    msg_copy = msg.copy()
+    msg_copy["timestamp"] = msg_copy["timestamp"].isoformat()
+    return msg_copy
+
+def write_messages_json(messages, output_path: str):
+    with JsonArrayWriter(output_path) as writer:
+        for msg in messages:
+            writer.write(message_to_json(msg))
+
+SENDER_MAP_PATH = "data/processed/sender_map.json"
+
+# sender_map.json is read-assigned-written by every ingest, including the
+# worker processes (init_worker hands them this lock), so it is a process lock
+sender_map_lock = get_context("spawn").Lock()
+
+def load_sender_map(path: str = SENDER_MAP_PATH) -> dict:
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def assign_sender_id(sender: str, path: str = SENDER_MAP_PATH) -> str:
+    """
+    The sender's id in the shared sender map, adding the sender with the
+    next free id if it is new. Ids are global, so the ones stored with the
+    chunks are the ones queries resolve sender names to.
+    """
+    with sender_map_lock:
+        sender_map = load_sender_map(path)
+        if sender not in sender_map:
+            max_id = max((int(v.split("_")[1]) for v in sender_map.values()), default=0)
+            sender_map[sender] = f"user_{max_id + 1:03d}"
+
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(sender_map, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        return sender_map[sender]
+
+def finalize_message(msg, raw_lines):
+    msg["message"] = "\n".join(raw_lines)
+    msg["raw_lines_count"] = len(raw_lines)
+    msg["is_multiline"] = len(raw_lines) > 1
+    msg["message_type"] = detect_message_type(msg["message"])
+    msg["message_hash"] = message_hash(msg)
+    return msg
+
+def message_hash(msg) -> str:
+    # stable across runs and re-exports, unlike message_id which is positional
+    key = f'{msg["timestamp"].isoformat()}|{msg["sender"]}|{msg["message"]}'
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+def content_key(msg) -> int:
+    return hash((msg["timestamp"], msg["sender"], msg["message"]))
+
+def messages_after(messages, watermark_ts=None, watermark_hash=None):
+    """
+    Skips messages up to and including the watermark message, for exports
+    that repeat an already-ingested history. Messages sharing the
+    watermark's timestamp are skipped until the watermark hash is seen.
+    """
+    passed = watermark_ts is None
+
+    for msg in messages:
+        if not passed:
+            ts = msg["timestamp"]
+            if ts < watermark_ts:
+                continue
+            if ts == watermark_ts:
+                if msg["message_hash"] == watermark_hash:
+                    passed = True
+                continue
+            passed = True
+        yield msg
+
+# how far back in chat time repeated lines and messages are looked for
+DEDUP_WINDOW = timedelta(hours=float(os.getenv("DEDUP_WINDOW_HOURS", "24")))
+
+class RecentKeys:
+    """
+    Hashes seen within the last `window` of chat time. Exports are in
+    timestamp order, so this holds the keys of one window's messages at
+    most, however long the chat is.
+    """
+
+    def __init__(self, window=DEDUP_WINDOW):
+        self.window = window
+        self._keys = set()
+        self._order = deque()
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key, ts):
+        self._keys.add(key)
+        self._order.append((ts, key))
+
+    def expire(self, now):
+        cutoff = now - self.window
+        order = self._order
+        while order and order[0][0] < cutoff:
+            self._keys.discard(order.popleft()[1])
+
+def iter_whatsapp_messages(file_path: str, sender_map: dict):
+    """
+    Yields every message (system and noise included) in file order.
+    Repeated lines and messages are dropped when they fall within
+    DEDUP_WINDOW of each other; only their hashes are kept, and only for
+    that window. Repeats further apart (a whole export pasted in twice)
+    pass through: their chunks get the same content-derived ids, and
+    re-exports of an ingested source are cut at its watermark anyway.
+    """
     message_counter = 0
 
     current_msg = None
     raw_lines = []
-    seen_lines = set()
-    seen_content = set()
+    seen_lines = RecentKeys()
+    seen_content = RecentKeys()
 
     with open(file_path, "r", encoding="utf-8") as f:
-        for line in f:
+        head = list(islice(f, SNIFF_LINES))
+        lexer = sniff_format(head)
+        parse_line = lexer.parse
+
+        for line in chain(head, f):
             line = line.rstrip("\n")
-            if line in seen_lines:
+            line_key = hash(line)
+            if line_key in seen_lines:
                 continue
-            seen_lines.add(line)
-            line = line.rstrip("\n")
-            matcha = FORMAT_A_RE.search(line)
-            matchb = FORMAT_B_RE.search(line)
 
-            if matcha or matchb:
+            parsed = parse_line(line)
+
+            if parsed:
                 # finalize previous message if exists
                 if current_msg:
-                    current_msg["message"] = "\n".join(raw_lines)
-                    current_msg["raw_lines_count"] = len(raw_lines)
-                    current_msg["is_multiline"] = len(raw_lines) > 1
-                    current_msg["message_type"] = detect_message_type(current_msg["message"])
-                    content = (current_msg["timestamp"], current_msg["sender"], current_msg["message"])
-                    if content not in seen_content:
-                        seen_content.add(content)
-                        messages.append(current_msg)
+                    finalize_message(current_msg, raw_lines)
+                    key = content_key(current_msg)
+                    if key not in seen_content:
+                        seen_content.add(key, current_msg["timestamp"])
+                        yield current_msg
 
                 # start new message
-                parsed = parse_messages_start(line)
-                if parsed:
-                    date_str = parsed["date"]
-                    time_str = parsed["time"]
-                    sender = parsed["sender"]
-                    first_text = parsed["text"]
-                    format = parsed["format"]
-                    timestamp = parse_timestamp(date_str, time_str)
-                    sender_id = get_sender_id(sender, sender_map) if sender else None
-
-                    current_msg = {
-                        "message_id": f"msg_{message_counter}",
-                        "timestamp": timestamp,
-                        "sender": sender,
-                        "sender_id": sender_id,
-                        "message": "",
-                        "message_type": None,
-                        "is_multiline": False,
-                        "raw_lines_count": 0,
-                        "is_system": sender == None or is_system_message(first_text) 
-                    }
-                    message_counter += 1
-                    if current_msg["is_system"]:
-                        current_msg["message_type"] = "system"
-                    
-                    raw_lines = [first_text]
+                timestamp, sender, first_text = parsed
+                seen_lines.expire(timestamp)
+                seen_content.expire(timestamp)
+                sender_id = get_sender_id(sender, sender_map) if sender else None
+
+                current_msg = {
+                    "message_id": f"msg_{message_counter}",
+                    "timestamp": timestamp,
+                    "sender": sender,
+                    "sender_id": sender_id,
+                    "message": "",
+                    "message_type": None,
+                    "is_multiline": False,
+                    "raw_lines_count": 0,
+                    "is_system": sender == None or is_system_message(first_text) 
+                }
+                message_counter += 1
+                if current_msg["is_system"]:
+                    current_msg["message_type"] = "system"
+                
+                raw_lines = [first_text]
+                seen_lines.add(line_key, timestamp)
 
             else:
                 # continuation of current message
                 if current_msg:
                     raw_lines.append(line)
+                    seen_lines.add(line_key, current_msg["timestamp"])
 
     # finalize the last message
     if current_msg:
-        current_msg["message"] = "\n".join(raw_lines)
-        current_msg["raw_lines_count"] = len(raw_lines)
-        current_msg["is_multiline"] = len(raw_lines) > 1
-        if current_msg["message_type"] != "system": current_msg["message_type"] = detect_message_type(current_msg["message"]) 
-        content = (current_msg["timestamp"], current_msg["sender"], current_msg["message"])
-        if content not in seen_content:
-            seen_content.add(content)
-            messages.append(current_msg)
-        
-    normal_msgs,noise_msgs = split_noise_messages(messages)
-
-    write_messages_json(normal_msgs,f"data/processed/{file_name}_messages.json")
-    write_messages_json(noise_msgs,f"data/processed/{file_name}_noise_messages.json")
-
-    write_sender_map(sender_map, f"data/processed/sender_map.json")
-
-    return normal_msgs
+        finalize_message(current_msg, raw_lines)
+        if content_key(current_msg) not in seen_content:
+            yield current_msg
+
+def stream_whatsapp_chat(file_path: str, file_name: str, sender_map: dict = None):
+    """
+    Yields the non-noise messages of a chat export while writing the
+    processed message files as it goes. Sender ids come from the shared
+    sender map; sender_map, if given, is the cache of it to use.
+    """
+    if sender_map is None:
+        with sender_map_lock:
+            sender_map = load_sender_map()
+
+    with JsonArrayWriter(f"data/processed/{file_name}_messages.json") as normal_out, \
+            JsonArrayWriter(f"data/processed/{file_name}_noise_messages.json") as noise_out:
+        for msg in iter_whatsapp_messages(file_path, sender_map):
+            if is_noise_message(msg):
+                noise_out.write(message_to_json(msg))
+            else:
+                normal_out.write(message_to_json(msg))
+                yield msg
 
-    
\ No newline at end of file
+def parse_whatsapp_chat(file_path: str, file_name:str):
+    return list(stream_whatsapp_chat(file_path, file_name))
@@ -1,8 +1,31 @@
-from sentence_transformers import SentenceTransformer
+import os
+from rag.models import get_sentence_model, canonical_name, EMBEDDING_MODEL, EMBEDDING_BACKEND
+from .embedding_cache import get_embedding_cache
+
+USE_EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "1") == "1"
 
 class Embedder:
-    def __init__(self,model_name = "all-MiniLM-L6-V2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self,model_name = EMBEDDING_MODEL, use_cache = USE_EMBEDDING_CACHE, backend = EMBEDDING_BACKEND):
+        self.model_name = canonical_name(model_name)
+        self.backend = backend
+        # ONNX vectors differ slightly from torch ones, so they are cached apart
+        self.cache_key = self.model_name if backend == "torch" else f"{self.model_name}:{backend}"
+        self.cache = get_embedding_cache() if use_cache else None
+
+    @property
+    def model(self):
+        # shared through rag.models, loaded on the first encode
+        return get_sentence_model(self.model_name, self.backend)
+
+    def _encode_uncached(self, texts):
+        return self.model.encode(texts, show_progress_bar = False)
+
+    def encode_array(self, texts):
+        if isinstance(texts, str):
+            return self.encode_array([texts])[0]
+        if self.cache is None:
+            return self._encode_uncached(texts)
+        return self.cache.encode(self.cache_key, texts, self._encode_uncached)
 
     def encode(self,texts):
-        return self.model.encode(texts, show_progress_bar = False).tolist()
\ No newline at end of file
+        return self.encode_array(texts).tolist()
@@ -0,0 +1,159 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/cache/embeddings.sqlite")
+# ~1.5 KB per all-MiniLM-L6-v2 vector, so the default cap is ~750 MB on disk
+MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+# evict down to this fraction of the cap so eviction doesn't run every call
+EVICT_TO = 0.9
+# keys per IN (...) lookup, below SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, text hash), with an
+    entry cap and least-recently-used eviction.
+
+    Repeated texts inside one call are also encoded only once, which matters
+    for chats full of "ok" and emoji-only messages. hits/misses count texts,
+    so hit_rate is the share of texts that skipped the model.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+
+        # one connection shared by this process' threads, guarded by _lock;
+        # WAL lets ingest worker processes read while another one writes
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                UNIQUE (model, text_hash)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+        self._lock = threading.Lock()
+        self._entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, model, keys):
+        found = {}
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[i:i + LOOKUP_BATCH]
+            rows = self.conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                [model, *batch],
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _touch(self, model, keys, now):
+        self.conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+            [(now, model, key) for key in keys],
+        )
+
+    def _store(self, model, keys, vectors, now):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+            [(model, key, vector.tobytes(), now) for key, vector in zip(keys, vectors)],
+        )
+        self._entries += len(keys)
+
+    def _evict(self):
+        if self._entries <= self.max_entries:
+            return
+        # other processes may share the file, so recount before deleting
+        self._entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._entries - int(self.max_entries * EVICT_TO)
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self._entries -= excess
+
+    def encode(self, model_name, texts, encode_fn):
+        """
+        Returns a float32 array with one row per text. Only texts missing
+        from the cache are passed to encode_fn, each distinct text once.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        model = model_name.lower()
+        keys = [text_key(t) for t in texts]
+        unique = list(dict.fromkeys(keys))
+
+        with self._lock:
+            found = self._lookup(model, unique)
+
+        missing = [key for key in unique if key not in found]
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            vectors = np.asarray(encode_fn([text_by_key[key] for key in missing]), dtype=np.float32)
+            new_vectors = dict(zip(missing, vectors))
+        else:
+            new_vectors = {}
+
+        now = time.time_ns()
+        with self._lock:
+            if found:
+                self._touch(model, list(found), now)
+            if new_vectors:
+                self._store(model, missing, vectors, now)
+                self._evict()
+            self.conn.commit()
+
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+        found.update(new_vectors)
+        return np.stack([found[key] for key in keys])
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": self._entries,
+                "max_entries": self.max_entries
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(path=CACHE_PATH):
+    # one cache per file per process, so every Embedder shares its counters
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(path)
+        return _caches[path]
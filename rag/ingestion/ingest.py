@@ -1,6 +1,6 @@
 import json 
 from .embedder import Embedder
-from .vectordb import VectorDB
+from .vectordb import open_vectordb
 
 CHUNKS_PATH = "data/chunks/chunks.json"
 COLLECTION_NAME = "whatsapp_chunks"
@@ -30,7 +30,7 @@ def batchify(data, batch_size):
 def main():
     chunks = load_chunks(CHUNKS_PATH)
     embedder = Embedder()
-    vectordb = VectorDB(COLLECTION_NAME, PERSIST_DIR)
+    vectordb = open_vectordb(COLLECTION_NAME, PERSIST_DIR)
 
     for batch in batchify(chunks, BATCH_SIZE):
         texts = [normalize_text(c["text"]) for c in batch]
@@ -0,0 +1,227 @@
+"""
+ONNX Runtime backend for sentence-transformers models (CPU).
+
+    python -m rag.ingestion.onnx_backend --variant int8
+
+exports the model once (and quantizes it for int8), checks its embeddings
+against the PyTorch model and prints both throughputs. The files are
+cached under ONNX_CACHE_DIR, so later loads skip straight to inference.
+
+The exported graph is the transformer only; mean pooling and L2
+normalisation (the all-MiniLM-L6-v2 head) run in numpy. int8 uses dynamic
+quantization from onnxruntime.quantization, which needs the `onnx`
+package at export time only.
+"""
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "data/models/onnx")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 lets onnxruntime decide
+ONNX_BATCH_SIZE = 64
+# minimum cosine similarity to the torch embedding of the same text
+PARITY_THRESHOLD = {"fp32": 0.9999, "int8": 0.98}
+PARITY_TEXTS = [
+    "are we still going to goa next week?",
+    "I'll send the hotel booking details tonight",
+    "ok",
+    "can someone share the notes for the lab record, I missed class",
+    "the match was unreal 😂 that last over",
+    "rent is due on the 5th, please pay by upi",
+    "Messages and calls are end-to-end encrypted.",
+    "what did madhu say about the release deadline",
+]
+
+
+def model_dir(model_name, variant):
+    return os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"), variant)
+
+def export_fp32(st_model, out_dir):
+    import torch
+
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+
+    class Encoder(torch.nn.Module):
+        # passes the inputs by name; positional order differs between
+        # transformers versions
+        def __init__(self, model, input_names):
+            super().__init__()
+            self.model = model
+            self.input_names = input_names
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(self.input_names, inputs)))[0]
+
+    os.makedirs(out_dir, exist_ok=True)
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    tmp_path = os.path.join(out_dir, f"model.onnx.{os.getpid()}.tmp")
+    encoder = Encoder(transformer.auto_model.eval(), input_names)
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            dynamo=False,
+        )
+    os.replace(tmp_path, os.path.join(out_dir, "model.onnx"))
+
+    tokenizer.save_pretrained(out_dir)
+    normalize = any(type(module).__name__ == "Normalize" for module in st_model)
+    with open(os.path.join(out_dir, "onnx_config.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "input_names": input_names,
+            "max_seq_length": st_model.max_seq_length,
+            "pad_token": tokenizer.pad_token,
+            "pad_token_id": tokenizer.pad_token_id,
+            "normalize": normalize,
+        }, f, indent=2)
+
+def quantize_int8(fp32_dir, out_dir):
+    try:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError as e:
+        raise RuntimeError("int8 export needs the onnx package: pip install onnx") from e
+
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = os.path.join(out_dir, f"model.onnx.{os.getpid()}.tmp")
+    quantize_dynamic(os.path.join(fp32_dir, "model.onnx"), tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, os.path.join(out_dir, "model.onnx"))
+
+    for name in os.listdir(fp32_dir):
+        if name != "model.onnx" and not name.endswith(".tmp"):
+            with open(os.path.join(fp32_dir, name), "rb") as src, open(os.path.join(out_dir, name), "wb") as dst:
+                dst.write(src.read())
+
+
+class OnnxSentenceModel:
+    """Drop-in for SentenceTransformer.encode on an exported model."""
+
+    def __init__(self, path):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, "onnx_config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(
+            os.path.join(path, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.config["input_names"]:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+    def encode(self, texts, batch_size=ONNX_BATCH_SIZE, show_progress_bar=False):
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size)[0]
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # batching texts of similar length keeps padding (wasted compute) low
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = [None] * len(texts)
+        for i in range(0, len(texts), batch_size):
+            idx = order[i:i + batch_size]
+            for j, vector in zip(idx, self._encode_batch([texts[k] for k in idx])):
+                out[j] = vector
+        return np.stack(out).astype(np.float32)
+
+
+def check_parity(onnx_model, torch_model, texts=PARITY_TEXTS):
+    expected = torch_model.encode(texts, show_progress_bar=False)
+    actual = onnx_model.encode(texts)
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    actual = actual / np.linalg.norm(actual, axis=1, keepdims=True)
+    cosines = (expected * actual).sum(axis=1)
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
+
+def load_onnx_model(model_name, variant, torch_loader):
+    """
+    Returns an OnnxSentenceModel for model_name, exporting (and quantizing)
+    it on first use. torch_loader(model_name) returns the PyTorch model,
+    needed only for the export and the parity check. Raises RuntimeError
+    if the exported model doesn't match torch within PARITY_THRESHOLD.
+    """
+    path = model_dir(model_name, variant)
+    if not os.path.exists(os.path.join(path, "model.onnx")):
+        started = time.time()
+        fp32_path = model_dir(model_name, "fp32")
+        if not os.path.exists(os.path.join(fp32_path, "model.onnx")):
+            export_fp32(torch_loader(model_name), fp32_path)
+        if variant == "int8":
+            quantize_int8(fp32_path, path)
+        print(f"Exported {model_name} to ONNX {variant} in {time.time() - started:.1f}s")
+
+    model = OnnxSentenceModel(path)
+
+    parity_path = os.path.join(path, "parity.json")
+    if not os.path.exists(parity_path):
+        parity = check_parity(model, torch_loader(model_name))
+        parity["passed"] = parity["min_cosine"] >= PARITY_THRESHOLD[variant]
+        with open(parity_path, "w", encoding="utf-8") as f:
+            json.dump(parity, f, indent=2)
+        print(f"ONNX {variant} parity: {parity}")
+
+    with open(parity_path, "r", encoding="utf-8") as f:
+        parity = json.load(f)
+    if not parity["passed"]:
+        raise RuntimeError(
+            f"ONNX {variant} embeddings diverge from torch (min cosine {parity['min_cosine']:.4f}); "
+            f"delete {path} to re-export"
+        )
+    return model
+
+
+if __name__ == "__main__":
+    from rag.models import get_sentence_model, canonical_name, EMBEDDING_MODEL
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--variant", choices=["fp32", "int8"], default="int8")
+    parser.add_argument("--texts", type=int, default=2000, help="texts for the throughput comparison")
+    args = parser.parse_args()
+
+    name = canonical_name(args.model)
+    torch_model = get_sentence_model(name, backend="torch")
+    onnx_model = load_onnx_model(name, args.variant, lambda n: torch_model)
+
+    with open(os.path.join(model_dir(name, args.variant), "parity.json"), "r", encoding="utf-8") as f:
+        print("parity:", json.load(f))
+
+    texts = [PARITY_TEXTS[i % len(PARITY_TEXTS)] + f" {i}" for i in range(args.texts)]
+    for label, model in (("torch", torch_model), (f"onnx-{args.variant}", onnx_model)):
+        started = time.perf_counter()
+        model.encode(texts, show_progress_bar=False)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<12} {len(texts) / elapsed:>10,.0f} texts/s")
@@ -0,0 +1,73 @@
+"""
+Shared by the vector backends that keep one partition per source
+(vectordb.PartitionedVectorDB, shard_store.ShardVectorDB): which sources
+a where clause selects, and searching those partitions concurrently.
+
+A query then only touches the partitions of the sources it names, and
+deleting a source is dropping its partition.
+"""
+import os
+import heapq
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+# partitions searched at once per query; 1 searches them one by one
+SEARCH_THREADS = int(os.getenv("SEARCH_THREADS", str(min(8, os.cpu_count() or 1))))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def where_sources(where):
+    """the sources a where clause is limited to, or None for all of them"""
+    if not where:
+        return None
+    if "$and" in where:
+        for clause in where["$and"]:
+            sources = where_sources(clause)
+            if sources is not None:
+                return sources
+        return None
+    value = where.get("source")
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        if "$in" in value:
+            return list(value["$in"])
+        if "$eq" in value:
+            return [value["$eq"]]
+        return None
+    return [value]
+
+def strip_sources(where):
+    """where without its source clauses, which picking partitions already applied"""
+    if not where:
+        return None
+    if "$and" in where:
+        clauses = [c for c in (strip_sources(c) for c in where["$and"]) if c]
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    if "$or" in where:
+        return where
+    rest = {key: value for key, value in where.items() if key != "source"}
+    return rest or None
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="search")
+        return _executor
+
+def fan_out(fn, sources):
+    """[fn(source) for source in sources], run concurrently"""
+    sources = list(sources)
+    if len(sources) <= 1 or SEARCH_THREADS <= 1:
+        return [fn(source) for source in sources]
+    return list(_get_executor().map(fn, sources))
+
+def merge_hits(hit_lists, n_results):
+    """merges per-partition [(document, metadata, distance)] lists, each nearest first"""
+    return list(islice(heapq.merge(*hit_lists, key=lambda hit: hit[2]), n_results))
@@ -0,0 +1,404 @@
+"""
+In-process vector store with one shard per source (VECTOR_BACKEND=shards).
+
+    <persist_dir>/shards/<collection>/<source>/
+        shard.json     {"dim": 384}
+        vectors.f16    float16 rows, memory-mapped for search
+        rows.jsonl     {"id", "document", "metadata"} per row, same order
+
+Search is an exact top-k: the query is multiplied against the selected
+sources' matrices block by block (one shard per search thread, see
+partitions.fan_out), so only those sources are touched and no index
+has to be kept in memory. float16 halves the vector footprint compared
+to float32 and scores stay within ~1e-3 of it.
+
+New rows are appended; replacing, updating or deleting rows rewrites the
+shard into a fresh directory and swaps it in. Removing a source is
+removing its directory (drop_source). Readers reload a shard when its
+files change, and tolerate a torn last row left by an interrupted append.
+
+Distances are squared L2, like Chroma's default space, so Retriever
+turns them into the same scores with either backend.
+"""
+import os
+import json
+import time
+import shutil
+import threading
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from rag.ingestion.partitions import where_sources, strip_sources, fan_out, merge_hits
+
+BLOCK_ROWS = 16384  # rows converted to float32 at a time while scoring
+
+_shards = {}  # shard dir -> loaded Shard, shared by every ShardVectorDB
+_lock = threading.RLock()
+_swapping = set()  # shard dirs between the two renames of a _write
+_swapped = threading.Condition(_lock)
+
+# Windows refuses to move a directory while a file in it is mapped, which
+# a query that was already scoring the old shard can still hold for a moment
+REPLACE_ATTEMPTS = 20
+REPLACE_WAIT_SECONDS = 0.05
+
+
+class Shard:
+    def __init__(self, path):
+        with open(os.path.join(path, "shard.json"), "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        self.signature = _signature(path)
+
+        self.ids, self.documents, self.metadatas = [], [], []
+        with open(os.path.join(path, "rows.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # interrupted append
+                self.ids.append(row["id"])
+                self.documents.append(row["document"])
+                self.metadatas.append(row["metadata"])
+
+        vectors_path = os.path.join(path, "vectors.f16")
+        n = min(len(self.ids), os.path.getsize(vectors_path) // (2 * self.dim))
+        del self.ids[n:], self.documents[n:], self.metadatas[n:]
+        if n:
+            self.vectors = np.memmap(vectors_path, dtype=np.float16, mode="r", shape=(n, self.dim))
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float16)
+
+        self.index = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self.norms = np.empty(n, dtype=np.float32)
+        for i in range(0, n, BLOCK_ROWS):
+            block = self.vectors[i:i + BLOCK_ROWS].astype(np.float32)
+            self.norms[i:i + BLOCK_ROWS] = np.einsum("ij,ij->i", block, block)
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def close(self):
+        """unmaps the vectors file; a reader still holding this shard gets an in-memory copy"""
+        if isinstance(self.vectors, np.memmap):
+            self.vectors = np.array(self.vectors)
+
+    def column(self, key, numeric):
+        """metadata[key] for every row; missing values never match"""
+        name = (key, numeric)
+        if name not in self._columns:
+            if numeric:
+                values = [m.get(key) for m in self.metadatas]
+                self._columns[name] = np.array(
+                    [v if isinstance(v, (int, float)) else np.nan for v in values], dtype=np.float64
+                )
+            else:
+                self._columns[name] = np.array([m.get(key) for m in self.metadatas], dtype=object)
+        return self._columns[name]
+
+
+def _signature(path):
+    # changes whenever a row is appended or the shard is swapped
+    try:
+        rows = os.stat(os.path.join(path, "rows.jsonl"))
+        vectors = os.stat(os.path.join(path, "vectors.f16"))
+    except FileNotFoundError:
+        return None
+    return rows.st_ino, rows.st_size, rows.st_mtime_ns, vectors.st_size
+
+def _replace(src, dst):
+    for attempt in range(REPLACE_ATTEMPTS):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == REPLACE_ATTEMPTS - 1:
+                raise
+            time.sleep(REPLACE_WAIT_SECONDS)
+
+def _mask(shard, where):
+    """rows of shard matching a Chroma-style where clause"""
+    if "$and" in where:
+        mask = np.ones(len(shard), dtype=bool)
+        for clause in where["$and"]:
+            mask &= _mask(shard, clause)
+        return mask
+    if "$or" in where:
+        mask = np.zeros(len(shard), dtype=bool)
+        for clause in where["$or"]:
+            mask |= _mask(shard, clause)
+        return mask
+
+    mask = np.ones(len(shard), dtype=bool)
+    for key, condition in where.items():
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                column = shard.column(key, numeric=True)
+                with np.errstate(invalid="ignore"):
+                    if op == "$gt":
+                        mask &= column > value
+                    elif op == "$gte":
+                        mask &= column >= value
+                    elif op == "$lt":
+                        mask &= column < value
+                    else:
+                        mask &= column <= value
+            elif op in ("$eq", "$ne"):
+                matched = shard.column(key, numeric=False) == value
+                mask &= matched if op == "$eq" else ~matched
+            elif op in ("$in", "$nin"):
+                matched = np.isin(shard.column(key, numeric=False), list(value))
+                mask &= matched if op == "$in" else ~matched
+            else:
+                raise ValueError(f"Unsupported where operator {op}")
+    return mask
+
+class ShardVectorDB:
+    """Same interface as vectordb.VectorDB, stored as one shard per source."""
+
+    def __init__(self, collection_name, persist_dir):
+        self.root = os.path.join(persist_dir, "shards", collection_name)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, source):
+        return os.path.join(self.root, quote(str(source), safe=""))
+
+    def sources(self):
+        with _lock:
+            # a shard being swapped is briefly missing from root
+            while _swapping:
+                _swapped.wait()
+            return sorted(
+                unquote(name) for name in os.listdir(self.root)
+                if os.path.isfile(os.path.join(self.root, name, "shard.json"))
+            )
+
+    def _shard(self, source):
+        """the loaded shard for source, or None if it has no rows"""
+        path = self._path(source)
+        try:
+            return self._load(path)
+        except FileNotFoundError:
+            # swapped by another process between our stat and open; once
+            # more finds the new files in place
+            return self._load(path)
+
+    def _load(self, path):
+        with _lock:
+            # a swap in this process leaves no shard at path for a moment
+            while path in _swapping:
+                _swapped.wait()
+            signature = _signature(path)
+            shard = _shards.get(path)
+            if signature is None:
+                _shards.pop(path, None)
+                return None
+            if shard is None or shard.signature != signature:
+                shard = _shards[path] = Shard(path)
+        return shard
+
+    def _release(self, path):
+        # the next reader maps the new files instead of the cached ones
+        with _lock:
+            shard = _shards.pop(path, None)
+        if shard is not None:
+            shard.close()
+
+    def _write(self, source, ids, documents, metadatas, vectors):
+        """replaces the shard for source with exactly these rows"""
+        path = self._path(source)
+        # staged outside root so sources() never lists a half-written shard
+        staging = os.path.join(self.root, ".staging")
+        name = f"{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}"
+        tmp_path = os.path.join(staging, name + ".tmp")
+        old_path = os.path.join(staging, name + ".old")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        vectors = np.asarray(vectors, dtype=np.float16).reshape(len(ids), -1)
+        with open(os.path.join(tmp_path, "shard.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": vectors.shape[1]}, f)
+        vectors.tofile(os.path.join(tmp_path, "vectors.f16"))
+        with open(os.path.join(tmp_path, "rows.jsonl"), "w", encoding="utf-8") as f:
+            for row in zip(ids, documents, metadatas):
+                f.write(json.dumps({"id": row[0], "document": row[1], "metadata": row[2]}) + "\n")
+
+        with _lock:
+            _swapping.add(path)
+        try:
+            self._release(path)
+            if os.path.exists(path):
+                _replace(path, old_path)
+            _replace(tmp_path, path)
+        finally:
+            with _lock:
+                _swapping.discard(path)
+                _swapped.notify_all()
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def _intact(self, path, shard):
+        """False if an interrupted append left bytes beyond shard's rows"""
+        if os.path.getsize(os.path.join(path, "vectors.f16")) != len(shard) * shard.dim * 2:
+            return False
+        with open(os.path.join(path, "rows.jsonl"), "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return not len(shard)
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _append(self, source, shard, ids, documents, metadatas, vectors):
+        path = self._path(source)
+        if shard is None or not self._intact(path, shard):
+            if shard is not None:
+                # rewrite what was readable, dropping the torn tail
+                ids = shard.ids + ids
+                documents = shard.documents + documents
+                metadatas = shard.metadatas + metadatas
+                vectors = np.concatenate([np.array(shard.vectors, dtype=np.float32), vectors])
+            self._write(source, ids, documents, metadatas, vectors)
+            return
+        # vectors first: a row only counts once its sidecar line is complete
+        with open(os.path.join(path, "vectors.f16"), "ab") as f:
+            f.write(np.asarray(vectors, dtype=np.float16).tobytes())
+        with open(os.path.join(path, "rows.jsonl"), "a", encoding="utf-8") as f:
+            for row in zip(ids, documents, metadatas):
+                f.write(json.dumps({"id": row[0], "document": row[1], "metadata": row[2]}) + "\n")
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        by_source = {}
+        for i, meta in enumerate(metadatas):
+            by_source.setdefault(meta["source"], []).append(i)
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for source, rows in by_source.items():
+            new_ids = [ids[i] for i in rows]
+            new_docs = [documents[i] for i in rows]
+            new_metas = [metadatas[i] for i in rows]
+            new_vectors = embeddings[rows]
+
+            shard = self._shard(source)
+            if shard is None or not any(chunk_id in shard.index for chunk_id in new_ids):
+                self._append(source, shard, new_ids, new_docs, new_metas, new_vectors)
+                continue
+
+            replaced = set(new_ids)
+            keep = [i for i, chunk_id in enumerate(shard.ids) if chunk_id not in replaced]
+            self._write(
+                source,
+                [shard.ids[i] for i in keep] + new_ids,
+                [shard.documents[i] for i in keep] + new_docs,
+                [shard.metadatas[i] for i in keep] + new_metas,
+                np.concatenate([np.asarray(shard.vectors[keep], dtype=np.float32), new_vectors])
+            )
+
+    def count(self):
+        return sum(len(shard) for shard in map(self._shard, self.sources()) if shard)
+
+    def iter_metadatas(self, batch_size=2000):
+        for source in self.sources():
+            shard = self._shard(source)
+            if shard is None:
+                continue
+            for i in range(0, len(shard), batch_size):
+                yield shard.ids[i:i + batch_size], [dict(m) for m in shard.metadatas[i:i + batch_size]]
+
+    def _locate(self, ids):
+        """{source: [row, ...]} for the given ids"""
+        wanted = set(ids)
+        found = {}
+        for source in self.sources():
+            shard = self._shard(source)
+            if shard is None:
+                continue
+            rows = [shard.index[chunk_id] for chunk_id in wanted if chunk_id in shard.index]
+            if rows:
+                found[source] = rows
+        return found
+
+    def update_metadatas(self, ids, metadatas):
+        updates = dict(zip(ids, metadatas))
+        for source, rows in self._locate(ids).items():
+            shard = self._shard(source)
+            merged = list(shard.metadatas)
+            for i in rows:
+                merged[i] = {**merged[i], **updates[shard.ids[i]]}
+            self._write(source, shard.ids, shard.documents, merged, np.array(shard.vectors))
+
+    def ids_where(self, where, limit):
+        sources = where_sources(where)
+        rest = strip_sources(where)
+        ids = []
+        for source in self.sources() if sources is None else sources:
+            shard = self._shard(source)
+            if shard is None:
+                continue
+            rows = range(len(shard)) if rest is None else np.flatnonzero(_mask(shard, rest))
+            ids.extend(shard.ids[i] for i in rows[:limit - len(ids)])
+            if len(ids) >= limit:
+                break
+        return ids
+
+    def delete(self, ids):
+        for source, rows in self._locate(ids).items():
+            shard = self._shard(source)
+            removed = set(rows)
+            keep = [i for i in range(len(shard)) if i not in removed]
+            if not keep:
+                self.drop_source(source)
+                continue
+            self._write(
+                source,
+                [shard.ids[i] for i in keep],
+                [shard.documents[i] for i in keep],
+                [shard.metadatas[i] for i in keep],
+                shard.vectors[keep]
+            )
+
+    def drop_source(self, source):
+        """removes every row of source; returns how many there were"""
+        shard = self._shard(source)
+        count = len(shard) if shard else 0
+        path = self._path(source)
+        self._release(path)
+        shutil.rmtree(path, ignore_errors=True)
+        return count
+
+    def _query_shard(self, source, query, n_results, where):
+        shard = self._shard(source)
+        if shard is None:
+            return []
+        rows = None if where is None else np.flatnonzero(_mask(shard, where))
+        n = len(shard) if rows is None else len(rows)
+        if not n:
+            return []
+
+        dots = np.empty(n, dtype=np.float32)
+        for i in range(0, n, BLOCK_ROWS):
+            block = shard.vectors[i:i + BLOCK_ROWS] if rows is None else shard.vectors[rows[i:i + BLOCK_ROWS]]
+            dots[i:i + BLOCK_ROWS] = block.astype(np.float32) @ query
+        norms = shard.norms if rows is None else shard.norms[rows]
+        distances = norms + float(query @ query) - 2 * dots
+
+        top = np.argpartition(distances, n_results - 1)[:n_results] if n > n_results else np.arange(n)
+        top = top[np.argsort(distances[top], kind="stable")]
+        positions = top if rows is None else rows[top]
+        return [
+            (shard.documents[row], dict(shard.metadatas[row]), max(float(distances[j]), 0.0))
+            for j, row in zip(top, positions)
+        ]
+
+    def query(self, query_embedding, n_results, where=None):
+        """[(document, metadata, squared L2 distance)], nearest first"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        sources = where_sources(where)
+        rest = strip_sources(where)
+        # numpy releases the GIL in the matrix products, so shards score in parallel
+        hit_lists = fan_out(
+            lambda source: self._query_shard(source, query, n_results, rest),
+            self.sources() if sources is None else sources
+        )
+        return merge_hits(hit_lists, n_results)
@@ -1,5 +1,21 @@
+import os
+import hashlib
+import threading
 import chromadb
 from chromadb.config import Settings
+from chromadb.errors import NotFoundError
+from rag.ingestion.partitions import where_sources, strip_sources, fan_out, merge_hits
+
+# chroma (one HNSW collection), chroma-partitioned (one collection per
+# source) or shards (rag/ingestion/shard_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# ids per update call; callers may pass a whole source's worth at once
+UPDATE_BATCH_SIZE = 2000
+
+_handles = {}  # (persist_dir, collection_name) -> {source: Collection}
+_listed = set()  # keys whose handles were filled from list_collections()
+_handles_lock = threading.Lock()
 
 class VectorDB:
     def __init__(self, collection_name, persist_dir):
@@ -16,6 +32,240 @@ class VectorDB:
     
     def count(self):
         return self.collection.count()
+
+    def iter_metadatas(self, batch_size=2000):
+        """yields (ids, metadatas) pages over the whole collection"""
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            yield page["ids"], page["metadatas"]
+            offset += len(page["ids"])
+
+    def update_metadatas(self, ids, metadatas):
+        for i in range(0, len(ids), UPDATE_BATCH_SIZE):
+            self.collection.update(ids=ids[i:i + UPDATE_BATCH_SIZE], metadatas=metadatas[i:i + UPDATE_BATCH_SIZE])
+
+    def ids_where(self, where, limit):
+        return self.collection.get(where=where, limit=limit, include=[])["ids"]
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def query(self, query_embedding, n_results, where=None):
+        """[(document, metadata, distance)], nearest first"""
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=where
+        )
+        return list(zip(results["documents"][0], results["metadatas"][0], results["distances"][0]))
     
     # def persist(self):
-    #     self.client.persist()
\ No newline at end of file
+    #     self.client.persist()
+
+class PartitionedVectorDB:
+    """
+    VectorDB with one Chroma collection per source, so a query only
+    traverses the indexes of the sources it selects (searched in
+    parallel, see partitions.fan_out) and deleting a source drops its
+    collection.
+    """
+    def __init__(self, collection_name, persist_dir, check_legacy=True):
+        self.client = chromadb.PersistentClient(path=persist_dir)
+        self.prefix = collection_name
+        # collection handles, shared by every instance on the same store so
+        # a drop in one (a purge) is seen by the others (the retriever)
+        self.key = (os.path.abspath(persist_dir), collection_name)
+        with _handles_lock:
+            self.handles = _handles.setdefault(self.key, {})
+        if check_legacy:
+            self._check_legacy()
+
+    def _check_legacy(self):
+        # chunks in the single shared collection would silently drop out of every query
+        try:
+            legacy = self.client.get_collection(self.prefix).count()
+        except NotFoundError:
+            return
+        if legacy:
+            raise RuntimeError(
+                f"{legacy} chunks are still in the unpartitioned '{self.prefix}' collection; "
+                f"run `python -m rag.ingestion.vectordb migrate chroma-partitioned` first"
+            )
+
+    def _name(self, source):
+        # source ids are file names; collection names only allow [a-zA-Z0-9._-]
+        return f"{self.prefix}-{hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]}"
+
+    def _collection(self, source, create=False):
+        collection = self.handles.get(source)
+        if collection is not None:
+            return collection
+        if create:
+            collection = self.client.get_or_create_collection(self._name(source), metadata={"source": source})
+        else:
+            try:
+                collection = self.client.get_collection(self._name(source))
+            except NotFoundError:
+                return None
+        with _handles_lock:
+            self.handles[source] = collection
+        return collection
+
+    def _forget(self, source):
+        with _handles_lock:
+            self.handles.pop(source, None)
+
+    def _collections(self):
+        with _handles_lock:
+            listed = self.key in _listed
+        if not listed:
+            found = {}
+            for c in self.client.list_collections():
+                name = c if isinstance(c, str) else c.name
+                if name.startswith(self.prefix + "-"):
+                    collection = self.client.get_collection(name)
+                    if collection.metadata and "source" in collection.metadata:
+                        found[collection.metadata["source"]] = collection
+            with _handles_lock:
+                self.handles.update(found)
+                _listed.add(self.key)
+        with _handles_lock:
+            return list(self.handles.values())
+
+    def sources(self):
+        return sorted(c.metadata["source"] for c in self._collections() if c.metadata)
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        by_source = {}
+        for i, meta in enumerate(metadatas):
+            by_source.setdefault(meta["source"], []).append(i)
+        for source, rows in by_source.items():
+            self._collection(source, create=True).upsert(
+                ids=[ids[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows]
+            )
+
+    def count(self):
+        return sum(c.count() for c in self._collections())
+
+    def iter_metadatas(self, batch_size=2000):
+        for collection in self._collections():
+            offset = 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+                if not page["ids"]:
+                    break
+                yield page["ids"], page["metadatas"]
+                offset += len(page["ids"])
+
+    def update_metadatas(self, ids, metadatas):
+        updates = dict(zip(ids, metadatas))
+        ids = list(ids)
+        for collection in self._collections():
+            for i in range(0, len(ids), UPDATE_BATCH_SIZE):
+                present = collection.get(ids=ids[i:i + UPDATE_BATCH_SIZE], include=[])["ids"]
+                if present:
+                    collection.update(ids=present, metadatas=[updates[chunk_id] for chunk_id in present])
+
+    def ids_where(self, where, limit):
+        sources = where_sources(where)
+        rest = strip_sources(where)
+        collections = self._collections() if sources is None else [self._collection(s) for s in sources]
+        ids = []
+        for collection in collections:
+            if collection is None:
+                continue
+            ids.extend(collection.get(where=rest, limit=limit - len(ids), include=[])["ids"])
+            if len(ids) >= limit:
+                break
+        return ids
+
+    def delete(self, ids):
+        for collection in self._collections():
+            collection.delete(ids=ids)
+
+    def drop_source(self, source):
+        """removes every row of source; returns how many there were"""
+        collection = self._collection(source)
+        if collection is None:
+            return 0
+        count = collection.count()
+        self.client.delete_collection(collection.name)
+        self._forget(source)
+        return count
+
+    def _query_partition(self, source, query_embedding, n_results, where):
+        collection = self._collection(source)
+        if collection is None:
+            return []
+        try:
+            results = collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
+        except NotFoundError:
+            # dropped through a handle this process didn't share
+            self._forget(source)
+            return []
+        return list(zip(results["documents"][0], results["metadatas"][0], results["distances"][0]))
+
+    def query(self, query_embedding, n_results, where=None):
+        """[(document, metadata, distance)], nearest first"""
+        sources = where_sources(where)
+        rest = strip_sources(where)
+        hit_lists = fan_out(
+            lambda source: self._query_partition(source, query_embedding, n_results, rest),
+            self.sources() if sources is None else sources
+        )
+        return merge_hits(hit_lists, n_results)
+
+def open_vectordb(collection_name, persist_dir, backend=VECTOR_BACKEND):
+    if backend == "shards":
+        from rag.ingestion.shard_store import ShardVectorDB
+        return ShardVectorDB(collection_name, persist_dir)
+    if backend == "chroma-partitioned":
+        return PartitionedVectorDB(collection_name, persist_dir)
+    if backend != "chroma":
+        raise ValueError(f"Unknown vector backend {backend!r}, expected chroma, chroma-partitioned or shards")
+    return VectorDB(collection_name, persist_dir)
+
+def migrate_legacy(collection_name, persist_dir, backend, batch_size=2000):
+    """
+    Copies every chunk of the single shared collection into backend's
+    per-source partitions, then deletes the shared collection.
+    """
+    client = chromadb.PersistentClient(path=persist_dir)
+    try:
+        legacy = client.get_collection(collection_name)
+    except NotFoundError:
+        print(f"No '{collection_name}' collection to migrate")
+        return 0
+    if backend == "chroma-partitioned":
+        target = PartitionedVectorDB(collection_name, persist_dir, check_legacy=False)
+    else:
+        target = open_vectordb(collection_name, persist_dir, backend)
+
+    copied, offset = 0, 0
+    while True:
+        page = legacy.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        target.upsert(page["ids"], page["documents"], page["metadatas"], page["embeddings"])
+        copied += len(page["ids"])
+        offset += len(page["ids"])
+        print(f"Copied {copied} chunks")
+
+    client.delete_collection(collection_name)
+    return copied
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 3 and sys.argv[1] == "migrate" and sys.argv[2] in ("chroma-partitioned", "shards"):
+        migrate_legacy("whatsapp_chunks", "vector_store", sys.argv[2])
+    else:
+        print("usage: python -m rag.ingestion.vectordb migrate chroma-partitioned|shards")
+        sys.exit(2)
@@ -0,0 +1,219 @@
+"""
+Small in-process metrics registry rendered in the Prometheus text format.
+
+Counters, gauges and histograms are updated under a per-metric lock with a
+dict lookup, cheap enough for the per-query and per-batch hot paths.
+Values that already live elsewhere (cache stats, chunks per source) are
+read at scrape time through register_collector() instead of being copied.
+
+Metrics recorded inside spawned ingest worker processes stay in those
+processes; the parent records ingest stages from the timings they return.
+"""
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            items = [(key, dict(state, counts=list(state["counts"]))) for key, state in self._values.items()]
+
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {state['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+
+_metrics = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+def _register(metric):
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=()):
+    return _register(Gauge(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+def register_collector(fn):
+    """
+    fn() is called on every scrape and returns a list of
+    (name, kind, documentation, [(labels dict, value), ...]).
+    """
+    with _registry_lock:
+        _collectors.append(fn)
+
+def register_cache(cache_name, stats_fn):
+    """exports a cache's stats() (hits, misses, entries) labelled cache=cache_name"""
+    def collect():
+        stats = stats_fn()
+        hits = stats.get("hits", stats.get("exact_hits", 0) + stats.get("semantic_hits", 0))
+        misses = stats["misses"]
+        labels = {"cache": cache_name}
+        return [
+            ("rag_cache_hits_total", "counter", "Cache lookups that were served from the cache.", [(labels, hits)]),
+            ("rag_cache_misses_total", "counter", "Cache lookups that missed.", [(labels, misses)]),
+            ("rag_cache_hit_ratio", "gauge", "Share of lookups served from the cache.",
+             [(labels, hits / (hits + misses) if hits + misses else 0.0)]),
+            ("rag_cache_entries", "gauge", "Entries currently held by the cache.", [(labels, stats.get("entries", 0))]),
+        ]
+    register_collector(collect)
+
+def render():
+    with _registry_lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+
+    # collectors can report the same family (one per cache), but the
+    # format wants each family's HELP/TYPE once with its samples together
+    families = {}
+    for collect in collectors:
+        try:
+            collected = collect()
+        except Exception as e:
+            # one broken collector shouldn't take down the whole scrape
+            print(f"metrics collector failed: {e}")
+            continue
+        for name, kind, documentation, samples in collected:
+            family = families.setdefault(name, (kind, documentation, []))
+            family[2].extend(samples)
+
+    for name, (kind, documentation, samples) in families.items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            labels = labels or {}
+            lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+# Shared metric families; the modules that own each stage record into them.
+INGEST_STAGE_SECONDS = histogram(
+    "rag_ingest_stage_seconds", "Time spent per ingestion stage for one file.", ["stage"]
+)
+INGEST_MESSAGES = counter("rag_ingest_messages_total", "Messages chunked by ingestion.")
+INGEST_CHUNKS = counter("rag_ingest_chunks_total", "Chunks written to the vector store.")
+INGEST_FILES = counter("rag_ingest_files_total", "Files processed by ingestion.", ["outcome"])
+
+QUERY_STAGE_SECONDS = histogram(
+    "rag_query_stage_seconds", "Time spent per query stage.", ["stage"]
+)
+QUERIES = counter("rag_queries_total", "Queries answered.", ["endpoint", "outcome"])
+QUERIES_IN_PROGRESS = gauge("rag_queries_in_progress", "Queries being answered right now.", ["endpoint"])
+GENERATIONS_IN_PROGRESS = gauge("rag_generations_in_progress", "Requests currently waiting on the LLM.")
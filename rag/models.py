@@ -0,0 +1,69 @@
+import os
+import time
+import threading
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# torch, onnx (fp32) or onnx-int8; see rag/ingestion/onnx_backend.py
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Models come from the local hub cache. huggingface_hub reads this when it
+# is first imported, which is in _load below; set it to 0 to allow downloads.
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+# Chunking, ingestion and retrieval used to spell the model name three
+# different ways. Names are matched case-insensitively and loaded under
+# their hub spelling, so they all share one instance (and the offline
+# cache lookup doesn't depend on the filesystem being case-insensitive).
+CANONICAL_NAMES = {
+    "all-minilm-l6-v2": "all-MiniLM-L6-v2",
+    "sentence-transformers/all-minilm-l6-v2": "all-MiniLM-L6-v2",
+}
+
+_models = {}
+_load_seconds = {}
+_lock = threading.RLock()
+
+
+def canonical_name(model_name: str) -> str:
+    return CANONICAL_NAMES.get(model_name.lower(), model_name)
+
+def _load(name, backend):
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+
+    from rag.ingestion.onnx_backend import load_onnx_model
+    variant = "int8" if backend == "onnx-int8" else "fp32"
+    # the torch model is only loaded when the ONNX files need exporting or checking
+    return load_onnx_model(name, variant, lambda n: get_sentence_model(n, backend="torch"))
+
+def get_sentence_model(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND):
+    """
+    The process-wide model for (model_name, backend), loaded on first use.
+    Concurrent first calls wait for a single load. Every backend exposes
+    encode(texts, show_progress_bar=False) -> numpy array.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+
+    key = (canonical_name(model_name), backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            started = time.time()
+            _models[key] = _load(*key)
+            _load_seconds[key] = time.time() - started
+            print(f"Loaded {key[0]} ({backend}) in {_load_seconds[key]:.2f}s")
+        return _models[key]
+
+def warmup(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND):
+    # the first encode also pays for lazy kernel/tokenizer setup
+    get_sentence_model(model_name, backend).encode(["warmup"], show_progress_bar=False)
+
+def loaded_models():
+    with _lock:
+        return {f"{name} ({backend})": round(seconds, 3) for (name, backend), seconds in _load_seconds.items()}
@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# cosine similarity for near-duplicate hits; 0 disables them
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(PUNCTUATION_RE.sub(" ", query.lower()).split())
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of pipeline results.
+
+    Exact hits match the normalized query, the sorted source list and top_k.
+    With a similarity threshold and an embed_fn, a query whose embedding is
+    close enough to a cached query over the same sources is a hit too.
+
+    Every source has a version that invalidate_source() bumps (on re-ingest,
+    deactivation or deletion). Entries record the versions they were built
+    from, so an answer computed while a source changed is never served.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY, embed_fn=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn if similarity_threshold > 0 else None
+
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _key(self, query, sources, top_k):
+        return normalize_query(query), tuple(sorted(set(sources or []))), top_k
+
+    def versions(self, sources):
+        with self._lock:
+            return {s: self._versions.get(s, 0) for s in sources or []}
+
+    def _valid(self, entry, now):
+        if now - entry["created"] > self.ttl_seconds:
+            return False
+        return all(self._versions.get(s, 0) == v for s, v in entry["versions"].items())
+
+    def _semantic_lookup(self, key, embedding, now):
+        best_key, best_sim = None, self.similarity_threshold
+        for other_key, entry in self._entries.items():
+            if other_key[1:] != key[1:] or entry["embedding"] is None:
+                continue
+            sim = float(np.dot(embedding, entry["embedding"]))
+            if sim >= best_sim and self._valid(entry, now):
+                best_key, best_sim = other_key, sim
+        return best_key
+
+    def _embed(self, normalized):
+        vector = np.asarray(self.embed_fn(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, query, sources, top_k):
+        key = self._key(query, sources, top_k)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._valid(entry, now):
+                    self._entries.move_to_end(key)
+                    self.exact_hits += 1
+                    return entry["result"]
+                del self._entries[key]
+
+        if self.embed_fn is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        embedding = self._embed(key[0])
+        with self._lock:
+            hit_key = self._semantic_lookup(key, embedding, now)
+            if hit_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(hit_key)
+            self.semantic_hits += 1
+            return self._entries[hit_key]["result"]
+
+    def put(self, query, sources, top_k, result, versions):
+        """versions: the versions() snapshot taken before computing result"""
+        key = self._key(query, sources, top_k)
+        embedding = self._embed(key[0]) if self.embed_fn is not None else None
+
+        with self._lock:
+            self._entries[key] = {
+                "result": result,
+                "versions": versions,
+                "embedding": embedding,
+                "created": time.monotonic()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_source(self, source_id):
+        with self._lock:
+            self._versions[source_id] = self._versions.get(source_id, 0) + 1
+            stale = [key for key, entry in self._entries.items() if source_id in entry["versions"]]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
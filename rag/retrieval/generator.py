@@ -1,9 +1,27 @@
-import subprocess
+import os
 import json
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from rag.metrics import QUERY_STAGE_SECONDS, GENERATIONS_IN_PROGRESS
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
+# how long Ollama keeps the model loaded after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
 
 class AnswerGenerator:
-    def __init__(self, model_name = "llama3.1:8b"):
+    def __init__(self, model_name = "llama3.1:8b", base_url = OLLAMA_URL, keep_alive = OLLAMA_KEEP_ALIVE):
         self.model_name = model_name
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+
+        # one pooled keep-alive session instead of an `ollama run` process per query
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def build_prompt(self, user_query: str, retrieved_chunks: list):
         context_block = "\n\n".join(
@@ -30,24 +48,65 @@ class AnswerGenerator:
 
         return prompt.strip()
     
+    def _post(self, payload, stream=False):
+        payload = {"model": self.model_name, "keep_alive": self.keep_alive, **payload}
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                stream=stream,
+                timeout=OLLAMA_TIMEOUT
+            )
+        except requests.RequestException as e:
+            raise RuntimeError(f"Ollama error: {e}")
+
+        if response.status_code != 200:
+            raise RuntimeError(f"Ollama error: {response.status_code} {response.text}")
+        return response
+
+    def warmup(self):
+        # a request without a prompt just loads the model into memory
+        self._post({"stream": False})
+
     def generate(self, user_query: str, retrieved_chunks: list):
         if not retrieved_chunks:
             return "No relevant chunks found."
 
         prompt = self.build_prompt(user_query, retrieved_chunks)
+        with GENERATIONS_IN_PROGRESS.track_inprogress(), QUERY_STAGE_SECONDS.time(stage="generate"):
+            response = self._post({"prompt": prompt, "stream": False})
 
-        process = subprocess.Popen(
-            ["ollama", "run", self.model_name],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8'
-        )
+        return response.json()["response"].strip()
+
+    def stream(self, user_query: str, retrieved_chunks: list):
+        """Yields answer tokens as Ollama produces them."""
+        if not retrieved_chunks:
+            yield "No relevant chunks found."
+            return
+
+        prompt = self.build_prompt(user_query, retrieved_chunks)
+        started = time.perf_counter()
+        first_token = True
+
+        with GENERATIONS_IN_PROGRESS.track_inprogress():
+            response = self._post({"prompt": prompt, "stream": True}, stream=True)
 
-        output, error = process.communicate(prompt)
+            # read to the end (no break on "done") so the connection goes back to the pool
+            with response:
+                try:
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        data = json.loads(line)
+                        if data.get("error"):
+                            raise RuntimeError(f"Ollama error: {data['error']}")
+                        if data.get("response"):
+                            if first_token:
+                                QUERY_STAGE_SECONDS.observe(time.perf_counter() - started, stage="first_token")
+                                first_token = False
+                            yield data["response"]
+                except requests.RequestException as e:
+                    # Ollama went away mid-answer; same error type as _post
+                    raise RuntimeError(f"Ollama error: {e}")
 
-        if process.returncode != 0:
-            raise RuntimeError(f"Ollama error: {error}")
-        
-        return output.strip()
\ No newline at end of file
+        QUERY_STAGE_SECONDS.observe(time.perf_counter() - started, stage="generate")
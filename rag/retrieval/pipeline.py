@@ -1,8 +1,9 @@
 from rag.retrieval.search import Search
 from rag.retrieval.generator import AnswerGenerator
+from rag.retrieval.answer_cache import AnswerCache
 
 class pipeline:
-    def __init__(self, known_senders, collection_name, persist_dir):
+    def __init__(self, known_senders, collection_name, persist_dir, use_answer_cache=True):
         
         self.search = Search(
             known_senders=known_senders,
@@ -11,8 +12,27 @@ class pipeline:
         )
 
         self.generator = AnswerGenerator()
+
+        self.answer_cache = AnswerCache(
+            embed_fn=self.search.retriever.query_encoder.encode
+        ) if use_answer_cache else None
     
     def run(self, user_query: str, sources=None, top_k = 10):
+        if self.answer_cache is None:
+            return self._run(user_query, sources, top_k)
+
+        cached = self.answer_cache.get(user_query, sources, top_k)
+        if cached is not None:
+            return cached
+
+        # snapshot before running, so a source changing mid-query
+        # leaves the stored entry already stale
+        versions = self.answer_cache.versions(sources)
+        result = self._run(user_query, sources, top_k)
+        self.answer_cache.put(user_query, sources, top_k, result, versions)
+        return result
+
+    def _run(self, user_query: str, sources=None, top_k = 10):
         retrieval_result = self.search.run(
             user_query= user_query,
             top_k=top_k,
@@ -37,4 +57,46 @@ class pipeline:
             "parsed_query": retrieval_result["parsed_query"],
             "retrieved_chunks": retrieved_chunks,
             "answer":answer
-        }
\ No newline at end of file
+        }
+
+    def stream(self, user_query: str, sources=None, top_k = 10):
+        """
+        Yields ("chunks", {...}) as soon as retrieval finishes, then
+        ("token", text) for each generated piece of the answer.
+        A cached answer is sent as a single token.
+        """
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(user_query, sources, top_k)
+            if cached is not None:
+                yield "chunks", {
+                    "parsed_query": cached["parsed_query"],
+                    "retrieved_chunks": cached["retrieved_chunks"]
+                }
+                yield "token", cached["answer"]
+                return
+            versions = self.answer_cache.versions(sources)
+
+        retrieval_result = self.search.run(
+            user_query= user_query,
+            top_k=top_k,
+            sources = sources
+        )
+
+        retrieved_chunks = retrieval_result["results"]
+
+        yield "chunks", {
+            "parsed_query": retrieval_result["parsed_query"],
+            "retrieved_chunks": retrieved_chunks
+        }
+
+        tokens = []
+        for token in self.generator.stream(user_query, retrieved_chunks):
+            tokens.append(token)
+            yield "token", token
+
+        if self.answer_cache is not None:
+            self.answer_cache.put(user_query, sources, top_k, {
+                "parsed_query": retrieval_result["parsed_query"],
+                "retrieved_chunks": retrieved_chunks,
+                "answer": "".join(tokens).strip()
+            }, versions)
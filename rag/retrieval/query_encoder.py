@@ -0,0 +1,119 @@
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+# how long the first query of a batch waits for others to join it
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+
+
+class QueryEncoder:
+    """
+    Encodes queries through an LRU cache and a micro-batcher.
+
+    Cache misses are queued for a background thread, which gathers the
+    queries that arrive within QUERY_BATCH_WAIT_MS (up to QUERY_BATCH_MAX)
+    and runs one encode_fn call for all of them. Under concurrent load
+    that replaces many batch-of-one forward passes fighting over the same
+    cores; a lone query only pays the wait once.
+    """
+
+    def __init__(self, encode_fn, cache_size=QUERY_CACHE_SIZE, max_batch=QUERY_BATCH_MAX,
+                 max_wait_ms=QUERY_BATCH_WAIT_MS):
+        # encode_fn(list of texts) -> array with one row per text
+        self.encode_fn = encode_fn
+        self.cache_size = cache_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    def _start_worker(self):
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # the same text can be queued twice before the first result lands
+            futures = {}
+            for text, future in batch:
+                futures.setdefault(text, []).append(future)
+            texts = list(futures)
+
+            try:
+                vectors = np.asarray(self.encode_fn(texts), dtype=np.float32)
+            except Exception as e:
+                for waiting in futures.values():
+                    for future in waiting:
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self._remember(texts, vectors)
+            for text, vector in zip(texts, vectors):
+                for future in futures[text]:
+                    future.set_result(vector)
+
+    def _remember(self, texts, vectors):
+        with self._cache_lock:
+            for text, vector in zip(texts, vectors):
+                self._cache[text] = vector
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def encode(self, text: str):
+        """Returns the embedding of text as a list"""
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return vector.tolist()
+            self.misses += 1
+
+        self._start_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result().tolist()
+
+    def stats(self):
+        with self._cache_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._cache),
+                "batches": self.batches
+            }
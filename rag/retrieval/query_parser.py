@@ -1,31 +1,46 @@
 from typing import Dict, List
+from rag.retrieval.time_range import extract_time_range, to_epoch
+from rag.retrieval.sender_matcher import SenderMatcher
 
 class QueryParser:
-    def __init__(self,known_sender: Dict[str,str]):
+    def __init__(self,known_sender: Dict[str,str], now_fn=None):
         self.known_senders = known_sender
+        self.matcher = SenderMatcher(known_sender)
+        # injectable clock for relative dates ("yesterday", "last month")
+        self.now_fn = now_fn
 
-    def parse(self,query)-> Dict:
-        query_lower=query.lower()
+    def add_senders(self, senders: Dict[str,str]) -> int:
+        self.known_senders.update(senders)
+        return self.matcher.update(senders)
 
-        detected_sender_id = None
-        detected_sender_name = None
+    def parse(self,query)-> Dict:
+        matches = self.matcher.find_all(query)
 
-        for name, sender_id in self.known_senders.items():
-            if name.lower() in query_lower:
-                detected_sender_id = sender_id
-                detected_sender_name = name
-                break
+        sender_ids = list(dict.fromkeys(sender_id for sender_id, _, _, _ in matches))
+        sender_names = list(dict.fromkeys(name for _, name, _, _ in matches))
 
+        # cut the names out by position, right to left so offsets stay valid
         semantic_query = query
-        if detected_sender_name:
-            semantic_query = semantic_query.replace(detected_sender_name.lower(), "")
+        for _, _, start, end in reversed(matches):
+            semantic_query = semantic_query[:start] + semantic_query[end:]
+
+        start_ts = end_ts = None
+        time_range = extract_time_range(semantic_query, self.now_fn() if self.now_fn else None)
+        if time_range:
+            start, end, matched = time_range
+            start_ts, end_ts = to_epoch(start), to_epoch(end)
+            semantic_query = semantic_query.replace(matched, "")
 
-        semantic_query = semantic_query.strip()
+        semantic_query = " ".join(semantic_query.split())
 
         return {
             "original_query": query,
             "semantic_query": semantic_query,
-            "sender_id": detected_sender_id,
-            "sender_name": detected_sender_name
+            "sender_id": sender_ids[0] if sender_ids else None,
+            "sender_name": sender_names[0] if sender_names else None,
+            "sender_ids": sender_ids,
+            "sender_names": sender_names,
+            "start_ts": start_ts,
+            "end_ts": end_ts
         }
     
\ No newline at end of file
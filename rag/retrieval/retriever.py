@@ -1,33 +1,55 @@
-from sentence_transformers import SentenceTransformer
-import chromadb
+from rag.retrieval.query_encoder import QueryEncoder
+from rag.metrics import QUERY_STAGE_SECONDS
+from rag.models import EMBEDDING_MODEL
+from rag.ingestion.embedder import Embedder
+from rag.ingestion.vectordb import open_vectordb
+
+def build_where(sources, sender_id=None, start_ts=None, end_ts=None):
+    clauses = [{"source": {"$in": sources}}]
+    # sender_id is one id or a list of them (several senders named in a query)
+    if isinstance(sender_id, (list, tuple)):
+        if len(sender_id) == 1:
+            clauses.append({"sender_id": sender_id[0]})
+        elif sender_id:
+            clauses.append({"sender_id": {"$in": list(sender_id)}})
+    elif sender_id:
+        clauses.append({"sender_id": sender_id})
+    # a chunk matches when it overlaps the range
+    if start_ts is not None:
+        clauses.append({"end_ts": {"$gte": start_ts}})
+    if end_ts is not None:
+        clauses.append({"start_ts": {"$lte": end_ts}})
+    # Chroma wants at least two clauses under $and
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
 class Retriever:
-    def __init__(self, collection_name: str, persist_dir: str , embedding_model: str = "all-MiniLM-L6-V2"):
-        self.embedder = SentenceTransformer(embedding_model)
-        self.client = chromadb.PersistentClient(path=persist_dir)
-        self.collection = self.client.get_collection(collection_name)
-
-    def search(self, semantic_query:str, sources, sender_id: str=None, top_k=10):
-
+    def __init__(self, collection_name: str, persist_dir: str , embedding_model: str = EMBEDDING_MODEL):
+        # queries have their own in-memory cache, so skip the on-disk one
+        self.embedder = Embedder(embedding_model, use_cache=False)
+        self.query_encoder = QueryEncoder(self.embedder.encode_array)
+        # created empty on a fresh install instead of failing at startup
+        self.vectordb = open_vectordb(collection_name, persist_dir)
+
+    def _query(self, query_embedding, where, n_results):
+        with QUERY_STAGE_SECONDS.time(stage="vector_search"):
+            return self.vectordb.query(query_embedding, n_results, where)
+
+    def search(self, semantic_query:str, sources, sender_id=None, top_k=10, start_ts=None, end_ts=None):
+        """
+        sources, sender_id and the start_ts/end_ts range (epoch seconds,
+        see time_range.to_epoch) are applied by the vector store.
+        """
         if not sources:
             return []
 
-        query_embedding = self.embedder.encode(semantic_query).tolist()
-
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            where={"source":{"$in":sources}} if sources else None
-        )
+        with QUERY_STAGE_SECONDS.time(stage="query_embed"):
+            query_embedding = self.query_encoder.encode(semantic_query)
+        where = build_where(sources, sender_id, start_ts, end_ts)
 
-        documents = results["documents"][0]
-        metadatas = results["metadatas"][0]
-        distances = results["distances"][0]
+        hits = self._query(query_embedding, where, top_k)
 
         retrieved = []
-        for doc,meta, dist in zip(documents, metadatas, distances):
-            if sender_id and meta["sender_id"] !=sender_id:
-                continue
+        for doc,meta, dist in hits:
             retrieved.append({
                 "chunk_id":meta["chunk_id"],
                 "sender_id": meta["sender_id"],
@@ -35,4 +57,4 @@ class Retriever:
                 "score": 1 - dist
             })
 
-        return retrieved
\ No newline at end of file
+        return retrieved
@@ -1,5 +1,6 @@
 from rag.retrieval.query_parser import QueryParser
 from rag.retrieval.retriever import Retriever
+from rag.metrics import QUERY_STAGE_SECONDS
 
 class Search:
     def __init__(self, known_senders, collection_name, persist_dir):
@@ -10,12 +11,15 @@ class Search:
         )
 
     def run(self, user_query: str,sources=None, top_k: int=10):
-        parsed= self.parser.parse(user_query)
+        with QUERY_STAGE_SECONDS.time(stage="parse"):
+            parsed= self.parser.parse(user_query)
         results = self.retriever.search(
             semantic_query=parsed["semantic_query"],
             sources = sources,
-            sender_id=parsed["sender_id"],
-            top_k=top_k
+            sender_id=parsed["sender_ids"],
+            top_k=top_k,
+            start_ts=parsed["start_ts"],
+            end_ts=parsed["end_ts"]
         )
     
         return {
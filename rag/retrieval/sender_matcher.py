@@ -0,0 +1,77 @@
+import re
+import threading
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return [(m.group(0).lower(), m.start(), m.end()) for m in TOKEN_RE.finditer(text)]
+
+
+class SenderMatcher:
+    """
+    Token trie over the known sender names. A lookup walks the trie from
+    each query token, so its cost depends on the query length and the
+    longest name (in tokens), not on how many senders are known.
+
+    Matches are leftmost-longest and non-overlapping: with "Madhu" and
+    "Madhu Sharma" both known, "Madhu Sharma said" matches the longer name.
+    Names are matched on whole tokens, case-insensitively.
+    """
+
+    def __init__(self, senders=None):
+        self._root = {}
+        self._names = {}
+        self._lock = threading.Lock()
+        if senders:
+            self.update(senders)
+
+    def __len__(self):
+        return len(self._names)
+
+    def _insert(self, name, sender_id):
+        tokens = [token for token, _, _ in tokenize(name)]
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node[None] = (sender_id, name)
+
+    def update(self, senders):
+        """
+        Adds names that are new or whose id changed; returns how many.
+        Lookups don't take the lock; a name becomes visible to them once
+        its terminal entry is set.
+        """
+        added = 0
+        with self._lock:
+            for name, sender_id in senders.items():
+                if self._names.get(name) == sender_id:
+                    continue
+                self._insert(name, sender_id)
+                self._names[name] = sender_id
+                added += 1
+        return added
+
+    def find_all(self, query: str):
+        """Returns [(sender_id, name, start, end)] with character offsets into query."""
+        tokens = tokenize(query)
+        matches = []
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            best = None
+            j = i
+            while j < len(tokens) and tokens[j][0] in node:
+                node = node[tokens[j][0]]
+                j += 1
+                if None in node:
+                    best = (node[None], j)
+            if best is None:
+                i += 1
+                continue
+            (sender_id, name), end = best
+            matches.append((sender_id, name, tokens[i][1], tokens[end - 1][2]))
+            i = end
+        return matches
@@ -1,4 +1,5 @@
 from .pipeline import pipeline
+from backend.services.registry_service import list_sources
 import time
 
 import os
@@ -26,6 +27,7 @@ print(f"✓ Pipeline initialized in {init_time:.2f}s\n")
 
 # ============ CHECKPOINT 2: Query Setup ============
 query = "What was discussed about model?"
+sources = [item["source_id"] for item in list_sources() if item["active"]]
 print("=" * 60)
 print("CHECKPOINT 2: Query Setup")
 print("=" * 60)
@@ -39,7 +41,7 @@ print("CHECKPOINT 3: Running RAG Pipeline (Retrieval + Generation)...")
 print("=" * 60)
 start_total = time.time()
 
-result = rag.run(query, top_k=10,sources)
+result = rag.run(query, sources=sources, top_k=10)
 
 total_time = time.time() - start_total
 print(f"✓ RAG Pipeline completed in {total_time:.2f}s\n")
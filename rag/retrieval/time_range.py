@@ -0,0 +1,141 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+# Chat timestamps are naive wall-clock times, so they are converted as if
+# they were UTC. Ingestion and query parsing both go through to_epoch, so
+# the stored start_ts/end_ts and the query bounds always line up.
+def to_epoch(dt: datetime) -> int:
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3,
+    "april": 4, "apr": 4, "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7,
+    "august": 8, "aug": 8, "september": 9, "sept": 9, "sep": 9,
+    "october": 10, "oct": 10, "november": 11, "nov": 11, "december": 12, "dec": 12
+}
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+UNITS = {"day": 1, "days": 1, "week": 7, "weeks": 7, "month": 30, "months": 30, "year": 365, "years": 365}
+
+# A bare month name needs a preposition or a year next to it, otherwise
+# "may" and "mar" in ordinary questions would turn into date filters.
+MONTH_RE = re.compile(
+    rf"\b(?:(?P<prep>in|during|last|this|since)\s+)?(?P<month>{MONTH_NAMES})\.?(?:\s+(?P<year>\d{{4}}))?\b",
+    re.IGNORECASE
+)
+YEAR_RE = re.compile(r"\b(?P<prep>in|during|since)\s+(?P<year>(?:19|20)\d{2})\b", re.IGNORECASE)
+ISO_DATE_RE = re.compile(r"\b(?:(?P<prep>on|since)\s+)?(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})\b", re.IGNORECASE)
+LAST_N_RE = re.compile(r"\b(?:in\s+the\s+)?(?:last|past)\s+(?P<n>\d+)\s+(?P<unit>days?|weeks?|months?|years?)\b", re.IGNORECASE)
+RELATIVE_RE = re.compile(
+    r"\b(?P<phrase>today|yesterday|(?:last|this|past)\s+(?:week|month|year))\b",
+    re.IGNORECASE
+)
+
+
+def month_range(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end - timedelta(seconds=1)
+
+def year_range(year):
+    return datetime(year, 1, 1), datetime(year, 12, 31, 23, 59, 59)
+
+def day_range(day):
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1, seconds=-1)
+
+def _relative(phrase, now):
+    phrase = " ".join(phrase.lower().split())
+    today = datetime(now.year, now.month, now.day)
+
+    if phrase == "today":
+        return day_range(today)
+    if phrase == "yesterday":
+        return day_range(today - timedelta(days=1))
+    if phrase == "this week":
+        return today - timedelta(days=today.weekday()), now
+    if phrase == "last week":
+        start = today - timedelta(days=today.weekday() + 7)
+        return start, start + timedelta(days=7, seconds=-1)
+    if phrase == "past week":
+        return now - timedelta(days=7), now
+    if phrase == "this month":
+        return datetime(now.year, now.month, 1), now
+    if phrase == "last month":
+        year, month = (now.year - 1, 12) if now.month == 1 else (now.year, now.month - 1)
+        return month_range(year, month)
+    if phrase == "past month":
+        return now - timedelta(days=30), now
+    if phrase == "this year":
+        return datetime(now.year, 1, 1), now
+    if phrase == "last year":
+        return year_range(now.year - 1)
+    if phrase == "past year":
+        return now - timedelta(days=365), now
+    return None
+
+def _month(match, now):
+    month = MONTHS[match["month"].lower()]
+    prep = (match["prep"] or "").lower()
+
+    if match["year"]:
+        year = int(match["year"])
+    elif prep == "this":
+        year = now.year
+    elif prep == "last":
+        # the most recent such month before the current one
+        year = now.year if month < now.month else now.year - 1
+    elif prep:
+        # "in march" without a year: the latest march up to now
+        year = now.year if month <= now.month else now.year - 1
+    else:
+        return None
+
+    return month_range(year, month)
+
+def extract_time_range(query: str, now: datetime = None):
+    """
+    Finds a date range in a question, e.g. "last March", "in 2023",
+    "yesterday", "past 3 weeks" or "on 2023-04-01".
+
+    Returns (start, end, matched_text) with naive datetimes, or None.
+    A "since ..." phrase leaves the range open up to now.
+    """
+    now = now or datetime.now()
+
+    match = LAST_N_RE.search(query)
+    if match:
+        days = int(match["n"]) * UNITS[match["unit"].lower()]
+        return now - timedelta(days=days), now, match.group(0)
+
+    match = RELATIVE_RE.search(query)
+    if match:
+        start, end = _relative(match["phrase"], now)
+        return start, end, match.group(0)
+
+    match = ISO_DATE_RE.search(query)
+    if match:
+        try:
+            start, end = day_range(datetime(int(match["year"]), int(match["month"]), int(match["day"])))
+        except ValueError:
+            start = None
+        if start is not None:
+            if (match["prep"] or "").lower() == "since":
+                end = now
+            return start, end, match.group(0)
+
+    for match in MONTH_RE.finditer(query):
+        bounds = _month(match, now)
+        if bounds:
+            start, end = bounds
+            if (match["prep"] or "").lower() == "since":
+                end = now
+            return start, end, match.group(0)
+
+    match = YEAR_RE.search(query)
+    if match:
+        start, end = year_range(int(match["year"]))
+        if match["prep"].lower() == "since":
+            end = now
+        return start, end, match.group(0)
+
+    return None
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# unit tests never load a model or touch data/cache
+os.environ.setdefault("EMBEDDING_CACHE", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# manual scripts that load the model or query the real vector store on import
+collect_ignore = ["test_source_filter.py", "embedding_speed_test.py"]
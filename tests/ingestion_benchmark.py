@@ -0,0 +1,241 @@
+"""
+End-to-end ingestion benchmark on synthetic exports.
+
+    python tests/ingestion_benchmark.py --sizes 10000 100000 --formats A B --output bench.json
+    python tests/ingestion_benchmark.py --sizes 10000 --baseline bench.json --threshold 0.15
+
+Each (format, size) run happens in a fresh subprocess inside a temporary
+working directory, so peak RSS is per run, the embedding cache starts cold
+and nothing is written to the real data/ or vector_store/. A run goes
+through parse_whatsapp_chat -> create_chunks -> embed -> upsert and
+records wall time, messages/sec and the peak RSS reached by the end of
+each stage.
+
+With --baseline, any stage slower than baseline * (1 + threshold) is
+reported and the script exits with status 1.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+UPSERT_BATCH_SIZE = 2000
+
+
+def windows_peak_rss_mb():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+    get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+    if not get_info(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        raise ctypes.WinError()
+    return counters.PeakWorkingSetSize / (1024 * 1024)
+
+def peak_rss_mb():
+    if resource is None:
+        return windows_peak_rss_mb()
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_one(size, fmt, seed):
+    """runs in the subprocess, with the temp dir as cwd"""
+    sys.path.insert(0, str(REPO_ROOT))
+    sys.path.insert(0, str(REPO_ROOT / "tests"))
+    from synthetic_chat import write_chat
+
+    stages = {}
+
+    def stage(name, started, count):
+        elapsed = time.perf_counter() - started
+        stages[name] = {
+            "seconds": round(elapsed, 4),
+            "items": count,
+            "items_per_sec": round(count / elapsed, 1) if elapsed else None,
+            "peak_rss_mb": round(peak_rss_mb(), 1)
+        }
+
+    file_name = f"bench_{fmt}_{size}"
+    os.makedirs("data/raw", exist_ok=True)
+    chat_path = write_chat(f"data/raw/{file_name}.txt", size, fmt, seed=seed)
+
+    started = time.perf_counter()
+    from rag.chunking.preprocessing import parse_whatsapp_chat
+    from rag.chunking.chunking import create_chunks, embedder
+    from rag.ingestion.vectordb import open_vectordb
+    from rag.retrieval.time_range import to_epoch
+    stages["import"] = {"seconds": round(time.perf_counter() - started, 4), "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+    started = time.perf_counter()
+    messages = parse_whatsapp_chat(chat_path, file_name)
+    stage("parse", started, len(messages))
+
+    started = time.perf_counter()
+    chunks = create_chunks(messages, file_name)
+    stage("chunk", started, len(messages))
+
+    started = time.perf_counter()
+    embeddings = embedder.encode([chunk["text"] for chunk in chunks])
+    stage("embed", started, len(chunks))
+
+    # same documents and metadata as ingestion_service.store_chunks
+    started = time.perf_counter()
+    vectordb = open_vectordb("whatsapp_chunks", "vector_store")
+    for i in range(0, len(chunks), UPSERT_BATCH_SIZE):
+        batch = chunks[i:i + UPSERT_BATCH_SIZE]
+        vectordb.upsert(
+            ids=[chunk["chunk_id"] for chunk in batch],
+            documents=[chunk["text"] for chunk in batch],
+            embeddings=embeddings[i:i + UPSERT_BATCH_SIZE],
+            metadatas=[{
+                "source": file_name,
+                "chunk_id": chunk["chunk_id"],
+                "sender_id": chunk["sender_id"],
+                "start_time": chunk["start_time"].isoformat(),
+                "end_time": chunk["end_time"].isoformat(),
+                "start_ts": to_epoch(chunk["start_time"]),
+                "end_ts": to_epoch(chunk["end_time"]),
+                "message_count": chunk["message_count"]
+            } for chunk in batch]
+        )
+    stage("upsert", started, len(chunks))
+
+    total = sum(s["seconds"] for name, s in stages.items() if name != "import")
+    return {
+        "format": fmt,
+        "messages": size,
+        "parsed_messages": len(messages),
+        "chunks": len(chunks),
+        "file_mb": round(os.path.getsize(chat_path) / (1024 * 1024), 2),
+        "stages": stages,
+        "total_seconds": round(total, 4),
+        "messages_per_sec": round(size / total, 1) if total else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+def run_in_subprocess(size, fmt, seed):
+    with tempfile.TemporaryDirectory(prefix="ingest_bench_") as workdir:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--run-one", str(size), "--formats", fmt, "--seed", str(seed)],
+            cwd=workdir,
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"benchmark run failed for format {fmt}, {size} messages")
+        # the last stdout line is the result; ingestion prints progress before it
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def compare(results, baseline, threshold):
+    """returns a list of regressions as human-readable strings"""
+    previous = {(r["format"], r["messages"]): r for r in baseline["runs"]}
+    regressions = []
+
+    for run in results["runs"]:
+        old = previous.get((run["format"], run["messages"]))
+        if old is None:
+            continue
+        for name, current in run["stages"].items():
+            if name == "import" or name not in old["stages"]:
+                continue
+            before, after = old["stages"][name]["seconds"], current["seconds"]
+            if before > 0 and after > before * (1 + threshold):
+                regressions.append(
+                    f"{run['format']}/{run['messages']} {name}: {before:.3f}s -> {after:.3f}s "
+                    f"(+{(after / before - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              stdout=subprocess.PIPE, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def print_run(run):
+    print(f"\nFormat {run['format']}, {run['messages']:,} messages -> {run['chunks']:,} chunks "
+          f"({run['file_mb']} MB)")
+    for name, s in run["stages"].items():
+        rate = f"{s['items_per_sec']:>12,.0f}/s" if s.get("items_per_sec") else " " * 14
+        print(f"  {name:<8} {s['seconds']:>9.2f}s {rate}   peak RSS {s['peak_rss_mb']:>8.1f} MB")
+    print(f"  total    {run['total_seconds']:>9.2f}s {run['messages_per_sec']:>12,.0f} msgs/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--formats", nargs="+", choices=["A", "B"], default=["A", "B"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown per stage before it counts as a regression")
+    parser.add_argument("--run-one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, args.formats[0], args.seed)))
+        sys.exit(0)
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": args.seed
+        },
+        "runs": []
+    }
+
+    for size in args.sizes:
+        for fmt in args.formats:
+            run = run_in_subprocess(size, fmt, args.seed)
+            results["runs"].append(run)
+            print_run(run)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nRegressions over {args.threshold:.0%}:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nNo stage regressed by more than {args.threshold:.0%}")
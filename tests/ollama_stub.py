@@ -0,0 +1,87 @@
+"""
+Minimal stand-in for the Ollama HTTP API (/api/generate), for testing the
+generator and /query/stream without a model.
+
+    python tests/ollama_stub.py --port 11434 --token-delay 0.02
+
+then point the backend at it with OLLAMA_URL=http://127.0.0.1:11434
+"""
+import json
+import time
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ANSWER = "This is a stub answer built from the retrieved chat excerpts."
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    token_delay = 0.0
+    first_token_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "stub")
+
+        if not request.get("prompt"):
+            # warmup / load request
+            self._send_json({"model": model, "response": "", "done": True})
+            return
+
+        time.sleep(self.first_token_delay)
+
+        if not request.get("stream", True):
+            self._send_json({"model": model, "response": ANSWER, "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(payload):
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for word in ANSWER.split(" "):
+            write_chunk({"model": model, "response": word + " ", "done": False})
+            time.sleep(self.token_delay)
+        write_chunk({"model": model, "response": "", "done": True})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def make_server(port=0, token_delay=0.0, first_token_delay=0.0):
+    handler = type("Handler", (OllamaStubHandler,), {
+        "token_delay": token_delay,
+        "first_token_delay": first_token_delay
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.token_delay, args.first_token_delay)
+    print(f"Ollama stub listening on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
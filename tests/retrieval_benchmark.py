@@ -0,0 +1,295 @@
+"""
+Query latency and recall benchmark.
+
+    python tests/retrieval_benchmark.py --messages 20000 --facts 50 --output retrieval.json
+    python tests/retrieval_benchmark.py --baseline retrieval.json --threshold 0.15
+
+Builds a synthetic chat with known facts planted at known positions,
+ingests it into a temporary Chroma store, then replays one question per
+fact (plus a sender-scoped variant) through Search.run and pipeline.run.
+Answers come from tests/ollama_stub.py, so generation costs a fixed,
+small amount and the numbers reflect retrieval.
+
+Reports p50/p95/p99 latency for query parsing, Search.run and
+pipeline.run, and for the query_embed, vector_search and generate stages
+inside them (the QUERY_STAGE_SECONDS observations), over a cold pass (empty query/answer caches) and warm
+passes, and recall@k: the share of questions whose planted fact is
+inside the top k chunks. With --baseline, a p95 slower than
+baseline * (1 + threshold) or a recall drop of more than 0.02 is a
+regression and the script exits with status 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "tests"))
+
+from synthetic_chat import write_chat
+from ollama_stub import make_server
+
+RECALL_AT = [1, 5, 10]
+# QUERY_STAGE_SECONDS stages reported alongside the end-to-end timings
+STAGES = ["query_embed", "vector_search", "generate"]
+RECALL_TOLERANCE = 0.02
+
+PLACES = ["goa", "ooty", "coorg", "munnar", "pondicherry", "hampi", "gokarna", "vizag", "kodaikanal", "wayanad"]
+THINGS = ["villa", "homestay", "resort", "cottage", "guest house"]
+FACTS = [
+    ("the wifi password for the {place} {thing} is {code}", "what is the wifi password for the {place} {thing}"),
+    ("the caretaker at the {place} {thing} is reachable on extension {code}", "how do we reach the caretaker at the {place} {thing}"),
+    ("locker number {code} has the spare keys for the {place} {thing}", "where are the spare keys for the {place} {thing}"),
+    ("the advance for the {place} {thing} was {code} rupees, paid already", "how much advance was paid for the {place} {thing}"),
+]
+
+
+def plant_facts(n_messages, n_facts, seed):
+    """returns (needles for write_chat, questions) with one fact per needle"""
+    rng = random.Random(seed)
+    combos = [(f, p, t) for f in FACTS for p in PLACES for t in THINGS]
+    rng.shuffle(combos)
+    positions = sorted(rng.sample(range(100, n_messages - 1), n_facts))
+
+    needles, questions = {}, []
+    for position, ((fact, question), place, thing) in zip(positions, combos):
+        needles[position] = fact.format(place=place, thing=thing, code=rng.randint(1000, 9999))
+        questions.append({"position": position, "question": question.format(place=place, thing=thing)})
+    return needles, questions
+
+def ingest(chat_path, file_name):
+    from rag.chunking.preprocessing import parse_whatsapp_chat
+    from rag.chunking.chunking import create_chunks, embedder
+    from rag.ingestion.vectordb import open_vectordb
+    from rag.retrieval.time_range import to_epoch
+
+    messages = parse_whatsapp_chat(chat_path, file_name)
+    chunks = create_chunks(messages, file_name)
+    embeddings = embedder.encode([chunk["text"] for chunk in chunks])
+
+    vectordb = open_vectordb("whatsapp_chunks", "vector_store")
+    for i in range(0, len(chunks), 2000):
+        batch = chunks[i:i + 2000]
+        vectordb.upsert(
+            ids=[chunk["chunk_id"] for chunk in batch],
+            documents=[chunk["text"] for chunk in batch],
+            embeddings=embeddings[i:i + 2000],
+            metadatas=[{
+                "source": file_name,
+                "chunk_id": chunk["chunk_id"],
+                "sender_id": chunk["sender_id"],
+                "start_time": chunk["start_time"].isoformat(),
+                "end_time": chunk["end_time"].isoformat(),
+                "start_ts": to_epoch(chunk["start_time"]),
+                "end_ts": to_epoch(chunk["end_time"]),
+                "message_count": chunk["message_count"]
+            } for chunk in batch]
+        )
+    return chunks
+
+def attach_relevant(questions, needles, chunks, sender_map):
+    """adds the id of the chunk holding each fact, and a sender-scoped variant"""
+    scoped = []
+    for q in questions:
+        needle = needles[q["position"]]
+        q["relevant"] = [chunk["chunk_id"] for chunk in chunks if needle["text"] in chunk["text"]]
+        if needle["sender"] in sender_map:
+            scoped.append({
+                "position": q["position"],
+                "question": f"what did {needle['sender']} say about {q['question'].split(' the ', 1)[-1]}",
+                "relevant": q["relevant"],
+                "scoped": True
+            })
+    return questions + scoped
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "n": len(samples)
+    }
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+@contextmanager
+def recorded_stages(latencies):
+    """also appends each QUERY_STAGE_SECONDS observation of the STAGES to latencies[stage]"""
+    from rag.metrics import QUERY_STAGE_SECONDS
+    observe = QUERY_STAGE_SECONDS.observe
+
+    def recording(value, **labels):
+        if labels.get("stage") in STAGES:
+            latencies[labels["stage"]].append(value)
+        observe(value, **labels)
+
+    QUERY_STAGE_SECONDS.observe = recording
+    try:
+        yield
+    finally:
+        del QUERY_STAGE_SECONDS.observe
+
+def replay(rag, questions, sources, top_k):
+    latencies = {"parse": [], **{stage: [] for stage in STAGES}, "search": [], "pipeline": []}
+    hits = {k: 0 for k in RECALL_AT}
+
+    with recorded_stages(latencies):
+        for q in questions:
+            _, elapsed = timed(rag.search.parser.parse, q["question"])
+            latencies["parse"].append(elapsed)
+
+            result, elapsed = timed(rag.search.run, user_query=q["question"], sources=sources, top_k=top_k)
+            latencies["search"].append(elapsed)
+
+            retrieved = [chunk["chunk_id"] for chunk in result["results"]]
+            for k in RECALL_AT:
+                if set(q["relevant"]) & set(retrieved[:k]):
+                    hits[k] += 1
+
+            _, elapsed = timed(rag.run, user_query=q["question"], sources=sources, top_k=top_k)
+            latencies["pipeline"].append(elapsed)
+
+    recall = {f"recall@{k}": round(hits[k] / len(questions), 4) for k in RECALL_AT}
+    return latencies, recall
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="retrieval_bench_")
+    os.chdir(workdir)
+    os.makedirs("data/raw", exist_ok=True)
+
+    stub = make_server(0, token_delay=args.token_delay)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    file_name = "bench_chat"
+    needles, questions = plant_facts(args.messages, args.facts, args.seed)
+    chat_path = write_chat(f"data/raw/{file_name}.txt", args.messages, args.format, seed=args.seed, needles=needles)
+
+    print(f"Ingesting {args.messages:,} messages into {workdir}")
+    started = time.perf_counter()
+    chunks = ingest(chat_path, file_name)
+    print(f"  {len(chunks):,} chunks in {time.perf_counter() - started:.1f}s")
+
+    with open("data/processed/sender_map.json", "r", encoding="utf-8") as f:
+        sender_map = json.load(f)
+    questions = attach_relevant(questions, needles, chunks, sender_map)
+
+    from rag.retrieval.pipeline import pipeline
+    started = time.perf_counter()
+    rag = pipeline(
+        known_senders=sender_map,
+        collection_name="whatsapp_chunks",
+        persist_dir="vector_store",
+        use_answer_cache=args.answer_cache
+    )
+    init_seconds = time.perf_counter() - started
+
+    top_k = max(RECALL_AT)
+    cold, recall = replay(rag, questions, [file_name], top_k)
+    warm = {name: [] for name in cold}
+    for _ in range(args.warm_passes):
+        latencies, _ = replay(rag, questions, [file_name], top_k)
+        for name, samples in latencies.items():
+            warm[name].extend(samples)
+
+    stub.shutdown()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "messages": args.messages,
+            "chunks": len(chunks),
+            "questions": len(questions),
+            "format": args.format,
+            "seed": args.seed,
+            "answer_cache": args.answer_cache,
+            "vector_backend": os.environ.get("VECTOR_BACKEND", "chroma"),
+            "pipeline_init_seconds": round(init_seconds, 3)
+        },
+        "cold": {name: percentiles(samples) for name, samples in cold.items()},
+        "warm": {name: percentiles(samples) for name, samples in warm.items()},
+        "recall": recall
+    }
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for phase in ("cold", "warm"):
+        for name, current in results[phase].items():
+            old = baseline.get(phase, {}).get(name)
+            if not old or not current:
+                continue
+            if current["p95_ms"] > old["p95_ms"] * (1 + threshold):
+                regressions.append(f"{phase} {name} p95: {old['p95_ms']:.2f}ms -> {current['p95_ms']:.2f}ms")
+    for name, value in results["recall"].items():
+        old = baseline.get("recall", {}).get(name)
+        if old is not None and value < old - RECALL_TOLERANCE:
+            regressions.append(f"{name}: {old:.3f} -> {value:.3f}")
+    return regressions
+
+def print_results(results):
+    for phase in ("cold", "warm"):
+        print(f"\n{phase} latency")
+        for name, p in results[phase].items():
+            if p:
+                print(f"  {name:<13} p50 {p['p50_ms']:>9.2f}ms  p95 {p['p95_ms']:>9.2f}ms  p99 {p['p99_ms']:>9.2f}ms")
+    print("\n" + "  ".join(f"{name} {value:.3f}" for name, value in results["recall"].items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--facts", type=int, default=50)
+    parser.add_argument("--format", choices=["A", "B"], default="A")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm-passes", type=int, default=2)
+    parser.add_argument("--token-delay", type=float, default=0.0, help="stub delay per generated token")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the answer cache on (off by default)")
+    parser.add_argument("--vector-backend", choices=["chroma", "chroma-partitioned", "shards"], help="defaults to $VECTOR_BACKEND")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    # paths below are relative to the temp dir the run switches into
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    if args.vector_backend:
+        # read when rag.ingestion.vectordb is first imported, inside run()
+        os.environ["VECTOR_BACKEND"] = args.vector_backend
+
+    results = run(args)
+    print_results(results)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} latency / {RECALL_TOLERANCE} recall")
@@ -0,0 +1,150 @@
+"""
+Synthetic WhatsApp exports for benchmarks.
+
+    python tests/synthetic_chat.py data/raw/bench_100k.txt --messages 100000 --format B
+
+Format A is the iOS export: [m/d/yy, h:mm:ss AM] Sender: text
+Format B is the Android export: d/m/yyyy, h:mm am - Sender: text
+
+Conversations drift between topics in bursts from a few senders, with
+multiline messages, media/deleted placeholders, short reactions, group
+system lines and gaps of hours between sessions, so the parser, the noise
+filter and the chunker's split rules all get exercised.
+"""
+import random
+import argparse
+from datetime import datetime, timedelta
+
+TOPICS = {
+    "trip": ["goa", "train tickets", "hotel booking", "beach", "packing list", "itinerary", "flight delay"],
+    "work": ["deadline", "client call", "standup", "release", "code review", "the report", "appraisal"],
+    "food": ["biryani", "dinner tonight", "that new cafe", "recipe", "pizza", "lunch order", "dessert"],
+    "cricket": ["the match", "scorecard", "last over", "playing eleven", "the toss", "highlights"],
+    "exams": ["syllabus", "mock test", "results", "notes", "assignment", "lab record", "viva"],
+    "money": ["rent", "split the bill", "upi", "the loan", "salary", "budget", "refund"],
+}
+TEMPLATES = [
+    "did anyone check {w}?",
+    "i think {w} is sorted now",
+    "can we talk about {w} later",
+    "what about {w}",
+    "{w} is going to be a problem again",
+    "ok so {w} is confirmed",
+    "any update on {w}",
+    "sending the details for {w} in a bit",
+    "honestly {w} was better last time",
+    "who is handling {w}",
+]
+# continuation lines carry a number because the parser drops repeated lines
+FOLLOW_UPS = ["also check with the others about {w}, {n} of them replied", "and let me know by {n} tonight",
+              "i'll share the link for {w}, it's page {n}", "same as before, {n} for {w}",
+              "not sure about the timing, maybe {n}?", "ping me when you're free, I'm at {n}"]
+REACTIONS = ["ok", "👍", "😂", "hm", "ya", "no", "🙏"]
+PLACEHOLDERS = ["image omitted", "<Media omitted>", "This message was deleted", "sticker omitted",
+                "Missed voice call"]
+FIRST_NAMES = ["Madhu", "Vishnu", "Anil", "Priya", "Kiran", "Deepa", "Ravi", "Sneha", "Arjun", "Lakshmi",
+               "Rahul", "Divya", "Suresh", "Meena", "Vikram", "Kavya", "Naveen", "Pooja", "Ajay", "Swathi"]
+LAST_NAMES = ["Reddy", "Sharma", "Kumar", "Rao", "Nair", "Iyer", "Gupta", "Verma", "Das", "Menon"]
+
+
+def sender_names(count, rng):
+    names = []
+    for i in range(count):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        # keep names unique without making them all look generated
+        names.append(name if name not in names else f"{name} {i}")
+    return names
+
+def format_line(fmt, ts, sender, text):
+    if fmt == "A":
+        stamp = f"[{ts.month}/{ts.day}/{ts:%y}, {ts.hour % 12 or 12}:{ts:%M:%S} {ts:%p}]"
+        return f"{stamp} {sender}: {text}" if sender else f"{stamp} {text}"
+    stamp = f"{ts.day}/{ts.month}/{ts.year}, {ts.hour % 12 or 12}:{ts:%M} {ts:%p}".lower()
+    return f"{stamp} - {sender}: {text}" if sender else f"{stamp} - {text}"
+
+def follow_up(topic, rng):
+    return rng.choice(FOLLOW_UPS).format(w=rng.choice(TOPICS[topic]), n=rng.randint(1, 99999))
+
+def message_text(topic, rng):
+    roll = rng.random()
+    if roll < 0.08:
+        return rng.choice(REACTIONS)
+    if roll < 0.12:
+        return rng.choice(PLACEHOLDERS)
+
+    text = rng.choice(TEMPLATES).format(w=rng.choice(TOPICS[topic]))
+    if roll > 0.92:
+        # multiline message
+        lines = [text] + [follow_up(topic, rng) for _ in range(rng.randint(1, 4))]
+        return "\n".join(lines)
+    if roll > 0.80:
+        text += ", " + follow_up(topic, rng)
+    return text
+
+def system_text(senders, rng):
+    a, b = rng.sample(senders, 2)
+    return rng.choice([
+        f"{a} added {b}",
+        f"{a} left",
+        f"{a} changed the subject to \"{rng.choice(list(TOPICS))} plans\"",
+        f"{a} changed this group's icon",
+    ])
+
+def generate_lines(n_messages, fmt="A", n_senders=40, seed=0, start=datetime(2021, 1, 1, 9, 0), needles=None):
+    """
+    Yields the export line by line, n_messages messages in total.
+
+    needles maps a message index to a text that is written there instead
+    of a random message, for benchmarks that need to know where a fact is.
+    The sender and timestamp used are stored back into needles[index] as
+    {"text", "sender", "timestamp"}.
+    """
+    rng = random.Random(seed)
+    senders = sender_names(n_senders, rng)
+    ts = start
+
+    yield format_line(fmt, ts, None, "Messages and calls are end-to-end encrypted. No one outside of this chat can read them.")
+
+    written = 0
+    while written < n_messages:
+        # a session: a handful of active senders on one or two topics
+        ts += timedelta(hours=rng.choice([2, 5, 9, 14, 30]), minutes=rng.randint(0, 59))
+        active = rng.sample(senders, min(len(senders), rng.randint(2, 6)))
+        topic = rng.choice(list(TOPICS))
+
+        for _ in range(min(rng.randint(20, 120), n_messages - written)):
+            if rng.random() < 0.1:
+                topic = rng.choice(list(TOPICS))
+            ts += timedelta(seconds=rng.randint(5, 240))
+
+            if needles and written in needles:
+                sender = rng.choice(active)
+                text = needles[written]
+                needles[written] = {"text": text, "sender": sender, "timestamp": ts}
+                yield format_line(fmt, ts, sender, text)
+            elif rng.random() < 0.01:
+                yield format_line(fmt, ts, None, system_text(senders, rng))
+            else:
+                sender = rng.choice(active)
+                yield format_line(fmt, ts, sender, message_text(topic, rng))
+            written += 1
+
+def write_chat(path, n_messages, fmt="A", n_senders=40, seed=0, needles=None):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in generate_lines(n_messages, fmt, n_senders, seed, needles=needles):
+            f.write(line)
+            f.write("\n")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--format", choices=["A", "B"], default="A")
+    parser.add_argument("--senders", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_chat(args.output, args.messages, args.format, args.senders, args.seed)
+    print(f"Wrote {args.messages} messages to {args.output}")
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from rag.retrieval.answer_cache import AnswerCache
+
+
+def cached(cache, query, sources, top_k=5, result="answer"):
+    cache.put(query, sources, top_k, result, cache.versions(sources))
+
+
+def test_exact_hit_ignores_case_punctuation_and_source_order():
+    cache = AnswerCache()
+    cached(cache, "Where is the villa?", ["b", "a"])
+
+    assert cache.get("where is the   villa", ["a", "b"], 5) == "answer"
+    assert cache.get("where is the villa", ["a"], 5) is None
+    assert cache.get("where is the villa", ["a", "b"], 10) is None
+
+def test_invalidate_source_drops_only_its_entries():
+    cache = AnswerCache()
+    cached(cache, "q1", ["a"], result="one")
+    cached(cache, "q2", ["a", "b"], result="two")
+    cached(cache, "q3", ["b"], result="three")
+
+    cache.invalidate_source("a")
+
+    assert cache.get("q1", ["a"], 5) is None
+    assert cache.get("q2", ["a", "b"], 5) is None
+    assert cache.get("q3", ["b"], 5) == "three"
+
+def test_result_computed_during_a_source_change_is_not_served():
+    cache = AnswerCache()
+    versions = cache.versions(["a"])  # snapshot taken before retrieval
+    cache.invalidate_source("a")      # re-ingest lands while the answer is generated
+    cache.put("q", ["a"], 5, "stale", versions)
+
+    assert cache.get("q", ["a"], 5) is None
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("rag.retrieval.answer_cache.time.monotonic", lambda: clock[0])
+
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    cached(cache, "q1", ["a"])
+    cached(cache, "q2", ["a"])
+    cache.get("q1", ["a"], 5)  # q1 is now the most recently used
+    cached(cache, "q3", ["a"])
+
+    assert cache.get("q2", ["a"], 5) is None
+    assert cache.get("q1", ["a"], 5) == "answer"
+
+    clock[0] += 61
+    assert cache.get("q1", ["a"], 5) is None
+
+def test_near_duplicate_hit_needs_same_sources():
+    vectors = {"where is the villa": [1.0, 0.0], "where s the villa": [0.99, 0.14], "rent": [0.0, 1.0]}
+    cache = AnswerCache(similarity_threshold=0.95, embed_fn=lambda text: np.array(vectors[text]))
+    cached(cache, "where is the villa", ["a"])
+
+    assert cache.get("where's the villa", ["a"], 5) == "answer"
+    assert cache.get("where's the villa", ["b"], 5) is None
+    assert cache.get("rent", ["a"], 5) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    from backend.services import db, registry_service
+
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "registry.db")
+    db.pool.close()
+    db.init_db()
+    monkeypatch.setattr(registry_service, "_source_change_listeners", [])
+    yield registry_service
+    db.pool.close()
+    registry_service.invalidate_source_cache()
+
+def test_registry_writes_invalidate_the_cache(registry):
+    cache = AnswerCache()
+    registry.on_source_change(cache.invalidate_source)
+
+    registry.add_source("a", 10)
+    cached(cache, "q", ["a"])
+    registry.deactivate_source("a")
+    assert cache.get("q", ["a"], 5) is None
+
+    cached(cache, "q", ["a"])
+    registry.delete_source("a")
+    assert cache.get("q", ["a"], 5) is None
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from backend.services import ingestion_service
+from rag.ingestion.shard_store import ShardVectorDB
+
+
+def test_backfill_rewrites_each_shard_once(tmp_path, monkeypatch):
+    store = ShardVectorDB("chunks", str(tmp_path))
+    start = datetime(2024, 1, 1)
+    n = 5000
+    ids = [f"id{i}" for i in range(n)]
+    metadatas = [{
+        "source": f"chat{i % 2}",
+        "chunk_id": ids[i],
+        "start_time": (start + timedelta(minutes=i)).isoformat(),
+        "end_time": (start + timedelta(minutes=i + 5)).isoformat(),
+    } for i in range(n)]
+    store.upsert(ids, [f"doc {i}" for i in range(n)], metadatas, np.ones((n, 8), dtype=np.float32))
+
+    writes = []
+    write = store._write
+    monkeypatch.setattr(store, "_write", lambda source, *args: writes.append(source) or write(source, *args))
+    monkeypatch.setattr(ingestion_service, "open_vectordb", lambda *args: store)
+    monkeypatch.setattr(ingestion_service, "BATCH_SIZE", 500)
+
+    assert ingestion_service.backfill_time_metadata() == {"chunks_updated": n}
+    assert sorted(writes) == ["chat0", "chat1"]
+    assert len(store.ids_where({"end_ts": {"$gte": 0}}, n)) == n
+    # a second run finds nothing left to do
+    assert ingestion_service.backfill_time_metadata() == {"chunks_updated": 0}
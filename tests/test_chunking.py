@@ -0,0 +1,117 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from rag.chunking.chunking import SemanticChunker, SIM_THRESHOLD, MAX_CHARS, TIME_GAP_MINUTES
+
+
+def reference_chunks(messages, embeddings):
+    """the per-message loop SemanticChunker replaced, reduced to its split decisions"""
+    chunks = []
+    current, current_embeddings, prev_ts = None, [], None
+
+    def start(msg, embedding, reason, similarity=None):
+        return {"message_ids": [msg["message_id"]], "texts": [msg["message"].strip()],
+                "sender_id": msg["sender_id"], "reason": reason, "similarity": similarity}, [embedding]
+
+    for msg, embedding in zip(messages, embeddings):
+        text = msg["message"].strip()
+        if current is None:
+            current, current_embeddings = start(msg, embedding, "start")
+        elif msg["sender_id"] != current["sender_id"]:
+            chunks.append(current)
+            current, current_embeddings = start(msg, embedding, "sender_change")
+        elif msg["timestamp"] - prev_ts > timedelta(minutes=TIME_GAP_MINUTES):
+            chunks.append(current)
+            current, current_embeddings = start(msg, embedding, "time_gap")
+        elif sum(len(t) for t in current["texts"]) + len(text) > MAX_CHARS:
+            chunks.append(current)
+            current, current_embeddings = start(msg, embedding, "max_size")
+        else:
+            centroid = np.mean(current_embeddings, axis=0)
+            denom = np.linalg.norm(embedding) * np.linalg.norm(centroid)
+            similarity = float(embedding @ centroid / denom) if denom > 0 else 0.0
+            if similarity < SIM_THRESHOLD:
+                chunks.append(current)
+                current, current_embeddings = start(msg, embedding, "semantic_drift", similarity)
+            else:
+                current["message_ids"].append(msg["message_id"])
+                current["texts"].append(text)
+                current_embeddings.append(embedding)
+        prev_ts = msg["timestamp"]
+
+    if current is not None:
+        chunks.append(current)
+    return [(c["message_ids"], c["reason"], c["similarity"]) for c in chunks]
+
+def synthetic_messages(n, seed):
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    topics = np_rng.standard_normal((4, 16))
+    ts = datetime(2024, 1, 1, 9, 0)
+    topic = 0
+
+    messages, embeddings = [], []
+    for i in range(n):
+        ts += timedelta(minutes=rng.choice([1, 2, 5, 45]) if rng.random() < 0.1 else rng.randint(0, 3))
+        if rng.random() < 0.15:
+            topic = rng.randrange(len(topics))
+        length = rng.choice([5, 40, 200, 900])
+        messages.append({
+            "message_id": f"m{i}",
+            "message_hash": f"{i:040x}",
+            "sender_id": rng.choice(["u1", "u1", "u1", "u2", "u3"]),
+            "timestamp": ts,
+            "message": " " + "x" * length + " ",
+        })
+        if rng.random() < 0.02:
+            embeddings.append(np.zeros(16))
+        else:
+            embeddings.append(topics[topic] + 0.8 * np_rng.standard_normal(16))
+    return messages, np.array(embeddings, dtype=np.float32)
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 64, 5000])
+def test_matches_per_message_loop(batch_size):
+    messages, embeddings = synthetic_messages(3000, seed=batch_size)
+    expected = reference_chunks(messages, embeddings)
+
+    chunker = SemanticChunker(source_id="chat", keep_centroids=True)
+    for i in range(0, len(messages), batch_size):
+        chunker.feed(messages[i:i + batch_size], embeddings[i:i + batch_size])
+    chunks, centroids = chunker.finish()
+
+    assert len(chunks) == len(centroids) == len(expected)
+    reasons = set()
+    for chunk, (message_ids, reason, similarity) in zip(chunks, expected):
+        assert chunk["message_ids"] == message_ids
+        assert chunk["split_reason"] == reason
+        assert chunk["message_count"] == len(message_ids)
+        if similarity is None:
+            assert chunk["split_similarity"] is None
+        else:
+            assert chunk["split_similarity"] == pytest.approx(similarity, abs=1e-5)
+        reasons.add(reason)
+    assert all(centroid.dtype == np.float32 for centroid in centroids)
+    # the data exercises every kind of split
+    assert reasons == {"start", "sender_change", "time_gap", "max_size", "semantic_drift"}
+
+def test_chunk_ids_depend_on_source_and_messages():
+    messages, embeddings = synthetic_messages(200, seed=1)
+
+    def ids(source_id):
+        chunker = SemanticChunker(source_id=source_id)
+        chunker.feed(messages, embeddings)
+        return [chunk["chunk_id"] for chunk in chunker.finish()[0]]
+
+    assert ids("chat") == ids("chat")
+    assert not set(ids("chat")) & set(ids("other"))
+
+def test_centroids_only_kept_on_request():
+    messages, embeddings = synthetic_messages(200, seed=2)
+    chunker = SemanticChunker(source_id="chat")
+    chunker.feed(messages, embeddings)
+    chunks, centroids = chunker.finish()
+    assert chunks and centroids == []
@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+from backend.services import db
+
+
+@pytest.fixture
+def registry_path(tmp_path, monkeypatch):
+    path = tmp_path / "registry.db"
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.pool.close()
+    yield path
+    db.pool.close()
+
+def columns(path):
+    with sqlite3.connect(path) as conn:
+        return {row[1] for row in conn.execute("PRAGMA table_info(sources)")}
+
+def user_version(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def test_fresh_registry_gets_every_migration(registry_path):
+    db.init_db()
+    db.init_db()
+    assert user_version(registry_path) == len(db.MIGRATIONS)
+    assert {"content_hash", "bytes", "updated_at"} <= columns(registry_path)
+
+def test_interrupted_column_adds_do_not_break_startup(registry_path):
+    # a registry left at version 1 with part of migration 2 applied
+    conn = sqlite3.connect(registry_path)
+    conn.row_factory = sqlite3.Row
+    db._create_sources(conn.cursor())
+    conn.execute("ALTER TABLE sources ADD COLUMN bytes INTEGER DEFAULT 0")
+    conn.execute("PRAGMA user_version=1")
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+    assert user_version(registry_path) == len(db.MIGRATIONS)
+    assert {"bytes", "message_count", "ingest_seconds", "updated_at"} <= columns(registry_path)
+
+def test_failed_migration_is_rolled_back(registry_path, monkeypatch):
+    def broken(cursor):
+        cursor.execute("ALTER TABLE sources ADD COLUMN half_done TEXT")
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(db, "MIGRATIONS", db.MIGRATIONS + [broken])
+    with pytest.raises(RuntimeError):
+        db.init_db()
+
+    assert user_version(registry_path) == len(db.MIGRATIONS) - 1
+    assert "half_done" not in columns(registry_path)
@@ -0,0 +1,87 @@
+import re
+from datetime import datetime
+
+import pytest
+
+from rag.chunking.parsers import sniff_format
+from synthetic_chat import generate_lines
+
+# The line parser sniff_format replaced, kept here as the reference.
+FORMAT_A_RE = re.compile(r'^\[(\d{1,2}/\d{1,2}/\d{2}),\s([\d:]+\s[AP]M)\]\s(.+?):\s(.*)')
+FORMAT_B_RE = re.compile(r'^(\d{1,2}/\d{1,2}/\d{2,4}),\s([\d:]+\s?(?:AM|PM|am|pm))\s-\s(.*)', re.IGNORECASE)
+
+def reference_timestamp(date_str, time_str):
+    time_str = time_str.upper().replace('\u202f', ' ').strip()
+    if len(date_str.split('/')[2]) == 4:
+        with_sec, without_sec = "%m/%d/%Y %I:%M:%S %p", "%d/%m/%Y %I:%M %p"
+    else:
+        with_sec, without_sec = "%m/%d/%y %I:%M:%S %p", "%d/%m/%y %I:%M %p"
+    try:
+        return datetime.strptime(f"{date_str} {time_str}", with_sec)
+    except ValueError:
+        return datetime.strptime(f"{date_str} {time_str}", without_sec)
+
+def reference_parse(line):
+    m = FORMAT_A_RE.match(line)
+    if m:
+        date, time, sender, text = m.groups()
+        return reference_timestamp(date, time), sender, text
+    m = FORMAT_B_RE.match(line)
+    if m:
+        date, time, rest = m.groups()
+        if ":" in rest:
+            sender, text = rest.split(":", 1)
+            return reference_timestamp(date, time), sender.strip(), text.strip()
+        return reference_timestamp(date, time), None, rest.strip()
+    return None
+
+
+@pytest.mark.parametrize("fmt", ["A", "B"])
+def test_lexer_matches_reference_parser(fmt):
+    # generate_lines yields whole messages, multiline ones included
+    lines = "\n".join(generate_lines(3000, fmt, seed=3)).split("\n")
+    lexer = sniff_format(lines[:200])
+
+    starts = 0
+    for line in lines:
+        expected = reference_parse(line)
+        assert lexer.parse(line) == expected, line
+        starts += expected is not None
+    # both message starts and continuation lines were compared
+    assert 0 < starts < len(lines)
+
+@pytest.mark.parametrize("lines, expected", [
+    (["[1/25/24, 9:05:07 PM] Madhu Rao: hi there"],
+     (datetime(2024, 1, 25, 21, 5, 7), "Madhu Rao", "hi there")),
+    (["[1/25/24, 9:05:07\u202fPM] Madhu Rao: narrow space"],
+     (datetime(2024, 1, 25, 21, 5, 7), "Madhu Rao", "narrow space")),
+    (["25/01/2024, 9:05 pm - Madhu Rao: hi there"],
+     (datetime(2024, 1, 25, 21, 5), "Madhu Rao", "hi there")),
+    (["25/01/2024, 12:30 am - Messages and calls are end-to-end encrypted."],
+     (datetime(2024, 1, 25, 0, 30), None, "Messages and calls are end-to-end encrypted.")),
+])
+def test_message_start_lines(lines, expected):
+    assert sniff_format(lines).parse(lines[0]) == expected
+
+def test_continuation_lines():
+    lexer = sniff_format(["25/01/2024, 9:05 pm - Madhu Rao: hi"])
+    for line in ["", "just text", "2 people said: ok", "[not a date] x: y"]:
+        assert lexer.parse(line) is None
+
+def test_day_first_detected_from_dates():
+    # 13/01 can only be day-first, so 05/01 is the 5th of January too
+    lexer = sniff_format(["13/01/2024, 9:05 pm - A: x", "05/01/2024, 9:05 pm - A: y"])
+    assert lexer.parse("05/01/2024, 9:05 pm - A: y")[0] == datetime(2024, 1, 5, 21, 5)
+
+def test_ambiguous_head_settles_on_the_first_unambiguous_date():
+    # a month-first export whose first lines all have both parts <= 12
+    head = [f"1/{day}/24, 9:05 pm - A: x" for day in range(1, 13)]
+    lexer = sniff_format(head)
+    assert lexer.parse("1/13/24, 9:05 pm - A: y")[0] == datetime(2024, 1, 13, 21, 5)
+    # the order stays month-first for the rest of the file
+    assert lexer.parse("2/3/24, 9:05 pm - A: z")[0] == datetime(2024, 2, 3, 21, 5)
+
+def test_contradicting_date_switches_the_day_order():
+    lexer = sniff_format(["13/01/2024, 9:05 pm - A: x"])
+    assert lexer.parse("01/14/2024, 9:05 pm - A: y")[0] == datetime(2024, 1, 14, 21, 5)
+    assert lexer.parse("02/03/2024, 9:05 pm - A: z")[0] == datetime(2024, 2, 3, 21, 5)
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+from rag.chunking.preprocessing import RecentKeys, iter_whatsapp_messages
+from tests.synthetic_chat import format_line
+
+
+def test_repeated_lines_and_messages_are_dropped(tmp_path):
+    start = datetime(2024, 3, 1, 9, 0)
+    block = [format_line("A", start + timedelta(minutes=i), "Alice", f"message {i}") for i in range(5)]
+    path = tmp_path / "chat.txt"
+    # an overlapping stretch pasted in again
+    path.write_text("\n".join(block + block[2:]) + "\n", encoding="utf-8")
+
+    messages = list(iter_whatsapp_messages(str(path), {"Alice": "user_001"}))
+    assert [msg["message"] for msg in messages] == [f"message {i}" for i in range(5)]
+
+def test_recent_keys_only_hold_the_window():
+    keys = RecentKeys(window=timedelta(hours=24))
+    ts = datetime(2024, 1, 1)
+    for i in range(60 * 24):
+        ts += timedelta(minutes=30)
+        keys.expire(ts)
+        keys.add(i, ts)
+        assert len(keys) <= 49
+
+    assert 60 * 24 - 1 in keys
+    assert 0 not in keys
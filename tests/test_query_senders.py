@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from rag.chunking import chunking
+from rag.retrieval.query_parser import QueryParser
+from rag.ingestion.shard_store import ShardVectorDB
+from tests.test_sender_ids import FakeEmbedder, fake_encode, write_chat
+
+
+class FakeQueryEncoder:
+    def encode(self, text):
+        return np.ones(8, dtype=np.float32)
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data/raw").mkdir(parents=True)
+    monkeypatch.setattr(chunking, "embedder", FakeEmbedder())
+
+    from backend.services import db, registry_service, ingestion_service, query_service
+
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "registry.db")
+    db.pool.close()
+    db.init_db()
+    monkeypatch.setattr(registry_service, "_source_change_listeners", [])
+
+    vectordb = ShardVectorDB("chunks", str(tmp_path / "vector_store"))
+    monkeypatch.setattr(ingestion_service, "open_vectordb", lambda *args: vectordb)
+    monkeypatch.setattr(ingestion_service.embedder, "encode", fake_encode)
+
+    search = query_service.rag_pipeline.search
+    monkeypatch.setattr(search.retriever, "vectordb", vectordb)
+    monkeypatch.setattr(search.retriever, "query_encoder", FakeQueryEncoder())
+
+    yield ingestion_service, query_service, registry_service
+    db.pool.close()
+    registry_service.invalidate_source_cache()
+
+def test_reload_then_filtered_query_on_a_second_source(services, tmp_path, monkeypatch):
+    ingestion_service, query_service, registry_service = services
+    search = query_service.rag_pipeline.search
+
+    write_chat(tmp_path / "data/raw/first.txt", ["Alice", "Bob"])
+    ingestion_service.ingest_path("data/raw/first.txt")
+
+    # the server starts with the senders known so far
+    monkeypatch.setattr(search, "parser", QueryParser(query_service.load_sender_map()))
+    registry_service.on_source_change(query_service.reload_senders)
+
+    write_chat(tmp_path / "data/raw/second.txt", ["Carol", "Alice", "Dave"], fmt="B")
+    ingestion_service.ingest_path("data/raw/second.txt")
+
+    for name in ["Carol", "Alice", "Dave"]:
+        result = search.run(f"what did {name} say", sources=["second"])
+        assert result["parsed_query"]["sender_names"] == [name]
+        assert result["results"]
+        assert all(hit["text"].startswith(f"{name} says") for hit in result["results"])
@@ -0,0 +1,35 @@
+import json
+from datetime import datetime, timedelta
+
+from backend.services.ingest_worker import build_chunks
+from tests.synthetic_chat import format_line
+from tests.test_sender_ids import fake_encode, workdir  # noqa: F401 (fixture)
+
+
+def write_days(path, days):
+    lines = []
+    for day in range(days):
+        ts = datetime(2024, 3, 1 + day, 9, 0)
+        for i, sender in enumerate(["Alice", "Bob"]):
+            lines.append(format_line("A", ts + timedelta(minutes=i), sender, f"day {day} message {i}"))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+def stored_chunks():
+    with open("data/chunks/chat_chunks.json", encoding="utf-8") as f:
+        return [chunk["chunk_id"] for chunk in json.load(f)]
+
+def test_resumed_ingest_appends_to_the_chunks_file(workdir):
+    write_days(workdir / "data/raw/chat.txt", 2)
+    first = build_chunks("data/raw/chat.txt", encode=fake_encode)
+
+    # a later export of the same chat
+    write_days(workdir / "data/raw/chat.txt", 3)
+    second = build_chunks("data/raw/chat.txt", encode=fake_encode, watermark=first["watermark"])
+    assert second["chunks"]
+    expected = [chunk["chunk_id"] for chunk in first["chunks"] + second["chunks"]]
+    assert stored_chunks() == expected
+
+    # nothing new: the file is left alone
+    third = build_chunks("data/raw/chat.txt", encode=fake_encode, watermark=second["watermark"])
+    assert third["chunks"] == []
+    assert stored_chunks() == expected
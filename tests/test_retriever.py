@@ -0,0 +1,29 @@
+from rag.retrieval.retriever import build_where
+
+
+def test_sources_only_is_a_bare_clause():
+    assert build_where(["a", "b"]) == {"source": {"$in": ["a", "b"]}}
+
+def test_one_sender():
+    expected = {"$and": [{"source": {"$in": ["a"]}}, {"sender_id": "user_001"}]}
+    assert build_where(["a"], "user_001") == expected
+    assert build_where(["a"], ["user_001"]) == expected
+
+def test_several_senders():
+    assert build_where(["a"], ["user_001", "user_002"]) == {
+        "$and": [{"source": {"$in": ["a"]}}, {"sender_id": {"$in": ["user_001", "user_002"]}}]
+    }
+
+def test_no_sender():
+    assert build_where(["a"], []) == build_where(["a"], None) == {"source": {"$in": ["a"]}}
+
+def test_time_range_matches_overlapping_chunks():
+    assert build_where(["a"], start_ts=100, end_ts=200) == {
+        "$and": [{"source": {"$in": ["a"]}}, {"end_ts": {"$gte": 100}}, {"start_ts": {"$lte": 200}}]
+    }
+
+def test_open_ended_range_and_sender():
+    assert build_where(["a"], "user_001", start_ts=100) == {
+        "$and": [{"source": {"$in": ["a"]}}, {"sender_id": "user_001"}, {"end_ts": {"$gte": 100}}]
+    }
+    assert build_where(["a"], end_ts=0) == {"$and": [{"source": {"$in": ["a"]}}, {"start_ts": {"$lte": 0}}]}
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from rag.chunking import chunking
+from rag.chunking.preprocessing import load_sender_map
+from backend.services.ingest_worker import build_chunks
+from tests.synthetic_chat import format_line
+
+
+class FakeEmbedder:
+    def encode_array(self, texts):
+        return np.ones((len(texts), 8), dtype=np.float32)
+
+def fake_encode(texts):
+    return [[1.0] * 8 for _ in texts]
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(chunking, "embedder", FakeEmbedder())
+    (tmp_path / "data/raw").mkdir(parents=True)
+    return tmp_path
+
+def write_chat(path, senders, fmt="A"):
+    ts = datetime(2024, 3, 1, 9, 0)
+    lines = []
+    for i in range(12):
+        sender = senders[i % len(senders)]
+        ts += timedelta(minutes=1)
+        lines.append(format_line(fmt, ts, sender, f"{sender} says message number {i}"))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+def chunk_senders(chunks):
+    return [(chunk["sender_id"], chunk["text"].split(" says ")[0]) for chunk in chunks]
+
+def test_chunk_sender_ids_match_the_sender_map_across_sources(workdir):
+    write_chat(workdir / "data/raw/first.txt", ["Alice", "Bob"])
+    # a new sender first, so per-file numbering would give Carol user_001
+    write_chat(workdir / "data/raw/second.txt", ["Carol", "Alice", "Dave"], fmt="B")
+
+    first = build_chunks("data/raw/first.txt", encode=fake_encode)
+    second = build_chunks("data/raw/second.txt", encode=fake_encode)
+
+    sender_map = load_sender_map()
+    assert sorted(sender_map) == ["Alice", "Bob", "Carol", "Dave"]
+    assert len(set(sender_map.values())) == 4
+
+    for built in (first, second):
+        assert built["chunks"]
+        for sender_id, sender in chunk_senders(built["chunks"]):
+            assert sender_id == sender_map[sender]
+
+def test_existing_ids_are_kept(workdir):
+    write_chat(workdir / "data/raw/first.txt", ["Alice", "Bob"])
+    build_chunks("data/raw/first.txt", encode=fake_encode)
+    before = load_sender_map()
+
+    write_chat(workdir / "data/raw/second.txt", ["Bob", "Erin"])
+    build_chunks("data/raw/second.txt", encode=fake_encode)
+    after = load_sender_map()
+
+    assert {name: after[name] for name in before} == before
+    assert after["Erin"] not in before.values()
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from rag.ingestion.shard_store import ShardVectorDB
+
+DIM = 32
+N = 3000
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((N, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"id{i}" for i in range(N)]
+    metadatas = [{
+        "source": f"chat {i % 3}.txt",
+        "chunk_id": ids[i],
+        "sender_id": f"user_{i % 5:03d}",
+        "start_ts": float(i),
+        "end_ts": float(i + 10),
+    } for i in range(N)]
+    documents = [f"doc {i}" for i in range(N)]
+    return ids, documents, metadatas, vectors
+
+@pytest.fixture
+def db(tmp_path, data):
+    store = ShardVectorDB("whatsapp_chunks", str(tmp_path))
+    ids, documents, metadatas, vectors = data
+    for i in range(0, N, 700):  # several appends per shard
+        store.upsert(ids[i:i + 700], documents[i:i + 700], metadatas[i:i + 700], vectors[i:i + 700])
+    return store
+
+def brute_force(data, query, n, keep):
+    ids, _, metadatas, vectors = data
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    distances[[not keep(m) for m in metadatas]] = np.inf
+    order = [i for i in np.argsort(distances) if np.isfinite(distances[i])][:n]
+    return [ids[i] for i in order], distances[order]
+
+
+@pytest.mark.parametrize("where, keep", [
+    ({"source": {"$in": ["chat 0.txt", "chat 2.txt"]}},
+     lambda m: m["source"] in ("chat 0.txt", "chat 2.txt")),
+    ({"$and": [{"source": {"$in": ["chat 1.txt"]}}, {"sender_id": {"$in": ["user_001", "user_004"]}}]},
+     lambda m: m["source"] == "chat 1.txt" and m["sender_id"] in ("user_001", "user_004")),
+    ({"$and": [{"source": {"$in": ["chat 0.txt", "chat 1.txt", "chat 2.txt"]}},
+               {"end_ts": {"$gte": 1000.0}}, {"start_ts": {"$lte": 1500.0}}]},
+     lambda m: m["end_ts"] >= 1000 and m["start_ts"] <= 1500),
+    (None, lambda m: True),
+])
+def test_query_matches_brute_force(db, data, where, keep):
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        query = data[3][rng.integers(N)] + 0.3 * rng.standard_normal(DIM).astype(np.float32)
+        hits = db.query(query, 10, where)
+        expected_ids, expected_distances = brute_force(data, query, 10, keep)
+
+        assert [meta["chunk_id"] for _, meta, _ in hits] == expected_ids
+        # float16 storage
+        assert np.allclose([d for _, _, d in hits], expected_distances, atol=2e-3)
+        assert all(doc == f"doc {meta['chunk_id'][2:]}" for doc, meta, _ in hits)
+
+def test_unknown_source_returns_nothing(db, data):
+    assert db.query(data[3][0], 5, {"source": {"$in": ["missing"]}}) == []
+    assert db.ids_where({"source": "missing"}, 10) == []
+
+def test_upsert_replaces_existing_rows(db, data):
+    ids, _, metadatas, vectors = data
+    db.upsert(["id0"], ["changed"], [dict(metadatas[0], sender_id="user_999")], vectors[1:2])
+
+    assert db.count() == N
+    assert db.ids_where({"sender_id": "user_999"}, 10) == ["id0"]
+    # id0 now holds id1's vector
+    doc, meta, distance = db.query(vectors[1], 1, {"source": "chat 0.txt"})[0]
+    assert (doc, meta["chunk_id"]) == ("changed", "id0")
+    assert distance == pytest.approx(0, abs=2e-3)
+
+def test_update_delete_and_drop(db):
+    db.update_metadatas(["id3"], [{"sender_id": "user_777"}])
+    assert db.ids_where({"sender_id": "user_777"}, 10) == ["id3"]
+
+    db.delete(["id3", "id4"])
+    assert db.count() == N - 2
+    assert db.ids_where({"sender_id": "user_777"}, 10) == []
+
+    assert db.drop_source("chat 1.txt") == N // 3 - 1  # id4 was in chat 1
+    assert db.sources() == ["chat 0.txt", "chat 2.txt"]
+    assert sum(len(ids) for ids, _ in db.iter_metadatas(500)) == db.count()
+
+def test_torn_append_is_ignored_and_repaired(db, data):
+    ids, _, metadatas, vectors = data
+    shard_dir = db._path("chat 0.txt")
+    with open(os.path.join(shard_dir, "vectors.f16"), "ab") as f:
+        f.write(b"\0" * DIM * 2)
+    with open(os.path.join(shard_dir, "rows.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "torn"})[:8])
+
+    assert db.count() == N
+    db.upsert(["new"], ["new doc"], [{"source": "chat 0.txt", "chunk_id": "new", "sender_id": "x"}], vectors[:1])
+    assert db.count() == N + 1
+    assert db.ids_where({"sender_id": "x"}, 10) == ["new"]
+
+def test_rewrite_releases_the_memory_map(db):
+    shard = db._shard("chat 0.txt")
+    assert isinstance(shard.vectors, np.memmap)
+    db.update_metadatas(["id0"], [{"sender_id": "user_777"}])
+    # a reader still holding the old shard keeps working from memory
+    assert not isinstance(shard.vectors, np.memmap)
+    assert len(shard.vectors) == len(shard)
+
+def test_readers_never_see_a_shard_mid_swap(db, monkeypatch):
+    errors, stop = [], threading.Event()
+    replace = os.replace
+
+    def slow_replace(src, dst):
+        # widen the gap between moving the old shard out and the new one in
+        replace(src, dst)
+        time.sleep(0.01)
+
+    monkeypatch.setattr(os, "replace", slow_replace)
+
+    def read():
+        while not stop.is_set():
+            try:
+                if db.count() != N:
+                    errors.append("count")
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for i in range(20):
+        db.update_metadatas([f"id{i}"], [{"sender_id": "user_777"}])
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
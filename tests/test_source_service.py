@@ -0,0 +1,64 @@
+import os
+import sqlite3
+
+import pytest
+
+from backend.services import source_service
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for path in [
+        "data/raw/family.txt",
+        "data/raw/family.2024.txt",               # another source
+        "data/raw/family.txt.3f2a9c.part",        # upload in progress
+        "data/raw/family_old.txt",
+        "data/processed/family_messages.json",
+        "data/processed/family_noise_messages.json",
+        "data/chunks/family_chunks.json",
+        "data/chunks/family.2024_chunks.json",
+    ]:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "w").close()
+    return tmp_path
+
+def normalized(paths):
+    return sorted(os.path.normpath(p) for p in paths)
+
+def test_source_files_match_the_exact_stem(workdir):
+    assert normalized(source_service.source_files("family")) == normalized([
+        "data/raw/family.txt",
+        "data/processed/family_messages.json",
+        "data/processed/family_noise_messages.json",
+        "data/chunks/family_chunks.json",
+    ])
+
+def test_source_with_dots_in_its_name(workdir):
+    assert normalized(source_service.source_files("family.2024")) == normalized([
+        "data/raw/family.2024.txt",
+        "data/chunks/family.2024_chunks.json",
+    ])
+
+def test_unknown_source_has_no_files(workdir):
+    assert source_service.source_files("fam") == []
+
+
+def test_compaction_waits_for_enough_free_pages(tmp_path, monkeypatch):
+    path = tmp_path / "chroma.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x BLOB)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(b"x" * 2000,) for _ in range(200)])
+    conn.commit()
+    monkeypatch.setattr(source_service, "CHROMA_SQLITE", str(path))
+
+    conn.execute("DELETE FROM t WHERE rowid <= 20")
+    conn.commit()
+    assert 0 < source_service.free_page_ratio() < 0.3
+    assert source_service.compact_store() is False
+
+    conn.execute("DELETE FROM t")
+    conn.commit()
+    conn.close()
+    assert source_service.compact_store() is True
+    assert source_service.free_page_ratio() == 0
@@ -0,0 +1,46 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+from backend.services import db, registry_service, ingestion_service
+
+
+class FakeUpload:
+    def __init__(self, filename, content):
+        self.filename = filename
+        self._body = io.BytesIO(content)
+
+    async def read(self, size):
+        return self._body.read(size)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "registry.db")
+    db.pool.close()
+    db.init_db()
+    monkeypatch.setattr(registry_service, "_source_change_listeners", [])
+    yield tmp_path
+    db.pool.close()
+    registry_service.invalidate_source_cache()
+
+def save(filename, content):
+    return asyncio.run(ingestion_service.save_upload(FakeUpload(filename, content)))
+
+def test_new_upload_is_moved_into_raw(workdir):
+    path, _ = save("family.txt", b"hello")
+    assert os.listdir("data/raw") == ["family.txt"]
+    with open(path, "rb") as f:
+        assert f.read() == b"hello"
+
+def test_duplicate_upload_leaves_no_file_behind(workdir):
+    path, content_hash = save("family.txt", b"hello")
+    registry_service.add_source("family", 3, content_hash)
+
+    path, _ = save("family copy.txt", b"hello")
+    assert os.listdir("data/raw") == ["family.txt"]
+    assert ingestion_service.duplicate_result(path, content_hash)["duplicate_of"] == "family"